@@ -1 +1,11 @@
-from modtran.main import run
\ No newline at end of file
+from modtran.main import run, execute
+from modtran.parameters import Parameters
+from modtran.session import Session, Progress
+from modtran.cost import CostModel, estimate
+from modtran.batch import run_batch
+from modtran.surrogate import Surrogate
+from modtran.compensation import compensate
+from modtran.derivatives import jacobian
+from modtran.sampling import adaptive_sample
+from modtran.store import ResultStore, import_archive
+from modtran.solar import solar_position, solar_cases, run_solar
\ No newline at end of file
@@ -0,0 +1,4 @@
+import sys
+from modtran.cli import main
+
+sys.exit(main())
@@ -0,0 +1,162 @@
+# Runs many MODTRAN cases, executing each distinct case only once
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from modtran.parameters import to_parameters
+from modtran.cost import CostModel, schedule
+from modtran.session import Session, unique_prefix
+from modtran.store import ResultStore
+
+
+def run_batch(username: str,
+              password: str,
+              cases: list,
+              hostname = 'grissom.cis.rit.edu',
+              workers: int = 1,
+              cost_model: CostModel = None,
+              quiet: bool = True,
+              progress = None,
+              store: ResultStore = None,
+              callback = None,
+              on_error = None,
+              key_filename: str = None,
+              prefix: str = None,
+    ) -> list:
+    """Runs MODTRAN for a list of cases, running each distinct case only once.
+
+
+    Required Arguments:
+
+    username : str
+        Your CIS username
+
+    password : str or None
+        Your CIS password, or None to log in with an SSH key or agent (see key_filename)
+
+    cases : list
+        List of modtran.Parameters, or dictionaries of modtran.run keyword arguments.
+        Cases that MODTRAN treats identically (see 'help(modtran.Parameters)') are
+        run once and their output is shared.
+
+    hostname : str or list of str
+        Name of CIS host, or list of hosts to spread the cases over
+        Default setting is grissom.cis.rit.edu
+
+    workers : int
+        Number of cases run at the same time on each host
+        Default setting is 1
+
+    cost_model : modtran.CostModel
+        Predicts the runtime of each case.  Cases are dispatched longest-first, and the
+        observed runtimes are recorded to improve later predictions.
+        Default setting is a CostModel using ~/.modtran/runtimes.jsonl
+
+    quiet : bool
+        True - only capture MODTRAN's screen output (in each output's 'stdout' and 'stderr')
+        False - echo MODTRAN's screen output to the console
+        Default setting is True
+
+    progress : callable or None
+        Called with (case, modtran.Progress event) as each case advances through the spectrum
+        Default setting is None
+
+    store : modtran.ResultStore or None
+        Cases already in the store are served from it instead of being run, and new
+        results are added to it
+        Default setting is None
+
+    callback : callable or None
+        Called with (case, output) as soon as each distinct case finishes (or is served
+        from the store), from the thread that ran it
+        Default setting is None
+
+    on_error : callable or None
+        If None, an error in any case is raised once the batch finishes.  Otherwise it is
+        called with (case, exception), the batch carries on, and the case's output is None.
+        Default setting is None
+
+    key_filename : str or None
+        Private key file to log in with, see 'help(modtran.Session)'
+        Default setting is None
+
+    prefix : str or None
+        Name of the workspace directories on the server.  Batches running at the same time
+        must use different prefixes.
+        Default setting is unique to this process (modtran-temp-<local host>-<pid>)
+    __________________________________________________________________________________________
+
+    Returns:
+
+    outputs : list
+        List of output dictionaries (see 'help(modtran.run)'), one per case and in the
+        same order as cases.  Duplicate cases share the same output dictionary.
+    """
+    params = [to_parameters(case) for case in cases]
+    unique = list(dict.fromkeys(params))
+    hostnames = [hostname] if isinstance(hostname, str) else list(hostname)
+    if prefix is None:
+        prefix = unique_prefix()
+    if cost_model is None:
+        cost_model = CostModel()
+
+    outputs = {}
+    if store is not None:
+        for case in unique:
+            output = store.get(case)
+            if output is not None:
+                outputs[case] = output
+                if callback is not None:
+                    callback(case, output)
+    remaining = [case for case in unique if case not in outputs]
+
+    print('RUNNING ' + str(len(remaining)) + ' UNIQUE CASES (' + str(len(params) - len(unique)) +
+          ' DUPLICATES REMOVED, ' + str(len(unique) - len(remaining)) + ' FROM STORE)...')
+    if not remaining:
+        return [outputs[case] for case in params]
+    order, makespan = schedule(remaining, len(hostnames) * workers, cost_model)
+    print('    ESTIMATED TIME: ' + str(round(makespan)) + ' s ON ' + str(len(hostnames) * workers) + ' WORKERS')
+
+    queue = deque(remaining[i] for i in order)
+    lock = threading.Lock()
+
+    def worker(session):
+        while True:
+            with lock:
+                if not queue:
+                    return
+                case = queue.popleft()
+                print('CASE ' + str(len(remaining) - len(queue)) + ' OF ' + str(len(remaining)))
+            try:
+                if progress is None:
+                    output = session.run(case, quiet)
+                else:
+                    output = session.run(case, quiet, lambda event: progress(case, event))
+            except Exception as error:
+                if on_error is None:
+                    raise
+                on_error(case, error)
+                outputs[case] = None
+                continue
+            cost_model.record(case, output['runtime'])
+            if store is not None:
+                store.put(case, output, session.hostname)
+            outputs[case] = output
+            if callback is not None:
+                callback(case, output)
+
+    # One session per host, each with one workspace per worker (home directories are shared between hosts)
+    sessions = []
+    try:
+        for i, host in enumerate(hostnames):
+            name = prefix if len(hostnames) == 1 else prefix + '-' + str(i)
+            sessions.append(Session(username, password, host, workers, name, key_filename))
+        with ThreadPoolExecutor(max_workers=len(sessions) * workers) as executor:
+            futures = [executor.submit(worker, session) for session in sessions for j in range(workers)]
+        for future in futures:
+            future.result()
+    finally:
+        for session in sessions:
+            session.close()
+
+    return [outputs[case] for case in params]
@@ -0,0 +1,332 @@
+# Local daemon that shares authenticated sessions to the CIS hosts between processes
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import paramiko
+from modtran.parameters import Parameters
+from modtran.session import Progress, Session
+from modtran.tape7 import read_tape7
+
+
+DEFAULT_SOCKET = os.environ.get('MODTRAN_BROKER',
+                                os.path.join(os.path.expanduser('~'), '.modtran', 'broker.sock'))
+"""
+Location of the broker's Unix socket ($MODTRAN_BROKER if set; set it to '' to never use a broker)
+"""
+
+CONNECT_TIMEOUT = 5.0
+"""
+Seconds a client waits to connect to the broker before running without it
+"""
+
+HEARTBEAT = 10.0
+"""
+Seconds between the messages the broker sends a client while its case runs
+"""
+
+READ_TIMEOUT = 60.0
+"""
+Seconds a client waits for the next message from the broker before giving up on it
+"""
+
+TEXT_KEYS = ['tape5', 'stdout', 'stderr', 'tape7.scn', 'runtime']
+"""
+Keys of the output dictionary sent by the broker (the tape7.scn columns are parsed by the client)
+"""
+
+ERRORS = {
+    'ValueError': ValueError,
+    'TypeError': TypeError,
+    'AuthenticationException': paramiko.AuthenticationException,
+}
+"""
+Exceptions re-raised with their own type by clients (any other error becomes a RuntimeError)
+"""
+
+
+def available(path: str = DEFAULT_SOCKET) -> bool:
+    '''
+    Returns True if a broker socket exists at path (the broker may still have exited)
+    '''
+    return bool(path) and os.path.exists(path)
+
+
+def request(message: dict,
+            path: str = DEFAULT_SOCKET,
+            callback=None,
+            timeout: float = CONNECT_TIMEOUT,
+            read_timeout: float = READ_TIMEOUT,
+    ) -> dict:
+    '''
+    Sends a message to the broker and returns its final reply, passing intermediate replies
+    (e.g. progress events) to callback.  Raises OSError if no broker is listening, if it
+    doesn't accept the connection within timeout or send a message within read_timeout
+    seconds (socket.timeout), or if it sends something other than a reply (ConnectionError).
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path)
+        connection.settimeout(read_timeout)
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        with connection.makefile('rb') as replies:
+            for line in replies:
+                try:
+                    reply = json.loads(line)
+                except ValueError:
+                    reply = None
+                if not isinstance(reply, dict):
+                    raise ConnectionError("Broker at " + path + " sent a malformed reply")
+                if 'done' in reply:
+                    return reply
+                if callback is not None and 'alive' not in reply:
+                    callback(reply)
+    raise ConnectionError("Broker at " + path + " closed the connection")
+
+
+def submit(username: str,
+           password: str,
+           params: Parameters,
+           hostname: str = 'grissom.cis.rit.edu',
+           quiet: bool = False,
+           progress=None,
+           key_filename: str = None,
+           path: str = DEFAULT_SOCKET,
+    ) -> dict:
+    '''
+    Runs a case through the broker and returns the same output dictionary as modtran.run.
+    The broker logs in with username and password (or key_filename) the first time a host
+    is used and reuses that connection afterwards.  MODTRAN's screen output is printed once
+    the run is done unless quiet.  Raises OSError if no broker is listening.
+    '''
+    message = {
+        'username': username,
+        'password': password,
+        'hostname': hostname,
+        'key_filename': key_filename,
+        'case': params.as_dict(),
+        'progress': progress is not None,
+    }
+
+    def on_event(reply):
+        if progress is not None and 'progress' in reply:
+            progress(Progress(*reply['progress']))
+
+    if not quiet:
+        print('RUNNING MODTRAN ON ' + hostname + ' THROUGH BROKER...')
+    reply = request(message, path, on_event)
+    if 'error' in reply:
+        raise ERRORS.get(reply.get('type'), RuntimeError)(reply['error'])
+    if not isinstance(reply.get('output'), dict) or not all(key in reply['output'] for key in TEXT_KEYS):
+        raise ConnectionError("Broker at " + path + " sent a malformed reply")
+    output = {key: reply['output'][key] for key in TEXT_KEYS}
+    if not quiet:
+        print(output['stdout'])
+        if output['stderr']:
+            print(output['stderr'])
+    output.update(read_tape7(output['tape7.scn']))
+    return output
+
+
+class Broker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Long-lived local server that holds one modtran.Session per (host, username).
+
+    Clients (modtran.run, or modtran.broker.submit) connect to a Unix socket readable only
+    by you and send one case per connection.  The first case for a host logs in with the
+    client's credentials; later cases from any process reuse that session and its pool of
+    workspaces, so concurrent clients are multiplexed onto one authenticated connection.
+    A case sent with different credentials (password or key file) than the ones the session
+    logged in with is only run after those credentials pass a separate login.  Sessions
+    whose connection dropped are reopened on the next case.
+
+    path : str
+        Location of the Unix socket
+        Default setting is DEFAULT_SOCKET (~/.modtran/broker.sock)
+
+    workspaces : int
+        Number of workspaces per session, i.e. runs on each host at the same time
+        Default setting is 4
+
+    prefix : str
+        Name of the workspace directories on the server
+        Default setting is modtran-broker
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str = DEFAULT_SOCKET, workspaces: int = 4, prefix: str = 'modtran-broker'):
+        if not path:
+            raise ValueError("No broker socket path given")
+        if os.path.exists(path):
+            try:
+                request({'command': 'ping'}, path, timeout=5, read_timeout=5)
+            except socket.timeout:
+                raise RuntimeError("A broker is already listening on " + path + " but not responding")
+            except OSError:
+                os.remove(path)  # left over from a broker that did not shut down cleanly
+            else:
+                raise RuntimeError("A broker is already listening on " + path)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.workspaces = workspaces
+        self.prefix = prefix
+        self.sessions = {}
+        self._credentials = {}
+        self._logins = {}
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(path, BrokerHandler)
+        finally:
+            os.umask(old_umask)
+
+    def session(self, message: dict) -> Session:
+        '''
+        Returns the open session for the host and user of a message, logging in if needed.
+        Only logins to the same host and user wait for each other.
+        '''
+        key = (message['hostname'], message['username'])
+        credentials = hmac.new(self._secret, json.dumps([message['password'], message.get('key_filename')]).encode(),
+                               hashlib.sha256).digest()
+        with self._lock:
+            login = self._logins.setdefault(key, threading.Lock())
+        with login:
+            with self._lock:
+                session = self.sessions.get(key)
+            transport = session.ssh.get_transport() if session is not None else None
+            if transport is not None and transport.is_active():
+                if not hmac.compare_digest(credentials, self._credentials[key]):
+                    self._verify(message)
+                    self._credentials[key] = credentials
+                return session
+            if session is not None:
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            print('LOGGING IN TO ' + message['hostname'] + ' AS ' + message['username'] + '...')
+            session = Session(message['username'], message['password'], message['hostname'],
+                              workspaces=self.workspaces,
+                              prefix=self.prefix + '-' + str(os.getpid()) + '-' + message['hostname'].split('.')[0],
+                              key_filename=message.get('key_filename'))
+            with self._lock:
+                self.sessions[key] = session
+                self._credentials[key] = credentials
+            return session
+
+    def _verify(self, message: dict):
+        '''
+        Checks the credentials of a message with a separate login (raises
+        paramiko.AuthenticationException if they are wrong)
+        '''
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(message['hostname'], username=message['username'], password=message['password'],
+                        key_filename=message.get('key_filename'))
+        finally:
+            ssh.close()
+
+    def server_close(self):
+        super().server_close()
+        with self._lock:
+            for session in self.sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self.sessions = {}
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    '''
+    Handles one client connection: reads a message, runs its case and sends back the output,
+    with a heartbeat every HEARTBEAT seconds while the case runs
+    '''
+
+    def setup(self):
+        super().setup()
+        self._lock = threading.Lock()
+
+    def send(self, reply: dict):
+        try:
+            with self._lock:
+                self.wfile.write(json.dumps(reply).encode() + b'\n')
+                self.wfile.flush()
+        except OSError:
+            pass  # client went away, let the run finish so its workspace goes back to the pool
+
+    def heartbeat(self, done: threading.Event):
+        while not done.wait(HEARTBEAT):
+            self.send({'alive': True})
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+            if message.get('command') == 'ping':
+                with self.server._lock:
+                    sessions = [list(key) for key in self.server.sessions]
+                self.send({'done': True, 'sessions': sessions})
+                return
+            params = Parameters(**message['case'])
+            progress = (lambda event: self.send({'progress': list(event)})) if message.get('progress') else None
+            done = threading.Event()
+            threading.Thread(target=self.heartbeat, args=(done,), daemon=True).start()
+            try:
+                output = self.server.session(message).run(params, quiet=True, progress=progress)
+            finally:
+                done.set()
+        except Exception as error:
+            self.send({'done': True, 'type': type(error).__name__, 'error': str(error)})
+            return
+        self.send({'done': True, 'output': {key: output[key] for key in TEXT_KEYS}})
+
+
+def main(argv=None) -> int:
+    """Entry point of the 'modtran-broker' console script, type 'modtran-broker --help' for usage"""
+    parser = argparse.ArgumentParser(
+        prog='modtran-broker',
+        description="Keeps authenticated connections to the CIS servers open and shares them between "
+                    "local processes.  While it runs, modtran.run sends its cases to the broker.")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help="Unix socket to listen on (default: $MODTRAN_BROKER, then ~/.modtran/broker.sock)")
+    parser.add_argument('-j', '--workspaces', type=int, default=4,
+                        help="number of cases run at the same time on each host (default: 4)")
+    arguments = parser.parse_args(argv)
+
+    try:
+        broker = Broker(arguments.socket, arguments.workspaces)
+    except (OSError, RuntimeError, ValueError) as error:
+        print("modtran-broker: " + str(error), file=sys.stderr)
+        return 2
+
+    def stop(signum, frame):
+        threading.Thread(target=broker.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    print('BROKER LISTENING ON ' + arguments.socket)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.server_close()
+    print('BROKER STOPPED')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# Command-line batch runner: reads parameter sets, runs them and streams the results out
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import fields
+import numpy as np
+import paramiko
+from modtran.batch import run_batch
+from modtran.parameters import Parameters
+from modtran.store import ResultStore
+from modtran.tape7 import COLUMNS
+
+
+def read_cases(path: str, format: str = None) -> list:
+    '''
+    Reads parameter sets (dictionaries of modtran.run keyword arguments) from a JSON-lines or
+    CSV file, or from stdin if path is '-'.  The format is taken from the file extension
+    unless given ('jsonl' or 'csv').  CSV values are returned as strings (blank cells are
+    left out), see csv_case.
+    '''
+    if format is None:
+        format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    file = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if format == 'jsonl':
+            return [json.loads(line) for line in file if line.strip()]
+        elif format == 'csv':
+            names = [f.name for f in fields(Parameters) if f.init]
+            reader = csv.DictReader(file)
+            for name in reader.fieldnames or []:
+                if name not in names:
+                    raise ValueError("Unknown input " + str(name) + " in CSV header")
+            return [{name: value for name, value in row.items() if value is not None and value.strip() != ''}
+                    for row in reader]
+        raise ValueError("Invalid input format " + str(format) + ", must be 'jsonl' or 'csv'")
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def csv_case(row: dict) -> dict:
+    '''
+    Converts the string values of a CSV row to the types of the modtran.run keyword arguments
+    '''
+    types = {f.name: f.type for f in fields(Parameters) if f.init}
+    return {name: types[name](value.strip()) if types[name] != str else value for name, value in row.items()}
+
+
+def json_record(index: int, output: dict) -> str:
+    '''
+    Returns the JSON line of a result (its input line index and COLUMNS), with NaN and
+    infinite values written as null so that the line is valid JSON
+    '''
+    record = {'index': int(index)}
+    for column in COLUMNS:
+        values = np.asarray(output[column], dtype=float)
+        record[column] = np.where(np.isfinite(values), values, None).tolist()
+    return json.dumps(record, allow_nan=False)
+
+
+class ShardWriter:
+    '''
+    Writes results to numbered shard files of up to size cases each, as they arrive:
+        'npz'     - one array per column of shape (cases, wavelengths), NaN-padded, plus
+                    'index' (input line of each case), 'length' and 'tape5'
+        'parquet' - one row per case and wavelength with columns 'index' and COLUMNS
+                    (requires pyarrow)
+        'jsonl'   - one JSON object per case (written to stdout if directory is None)
+    '''
+
+    def __init__(self, directory: str, format: str = 'npz', size: int = 100):
+        if format not in ['npz', 'parquet', 'jsonl']:
+            raise ValueError("Invalid output format " + str(format) + ", must be 'npz', 'parquet' or 'jsonl'")
+        if format == 'parquet':
+            try:
+                import pyarrow, pyarrow.parquet
+            except ImportError:
+                raise ImportError("Writing Parquet shards requires pyarrow, type 'pip install pyarrow'")
+        self.directory = directory
+        self.format = format
+        self.size = size
+        self.shards = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        self._stdout = sys.stdout
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        elif format != 'jsonl':
+            raise ValueError("An output directory is required for " + format + " shards")
+
+    def write(self, index: int, output: dict):
+        with self._lock:
+            if self.format == 'jsonl' and self.directory is None:
+                self._stdout.write(json_record(index, output) + '\n')
+                self._stdout.flush()
+                return
+            self._rows.append((index, output))
+            if len(self._rows) >= self.size:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._rows:
+                self._flush()
+
+    def _flush(self):
+        path = os.path.join(self.directory, 'shard-' + str(self.shards).zfill(5) + '.' + self.format)
+        indices = np.array([index for index, output in self._rows])
+        lengths = np.array([len(output['WAVELEN MCRN']) for index, output in self._rows])
+        if self.format == 'npz':
+            arrays = {'index': indices, 'length': lengths,
+                      'tape5': np.array([output['tape5'] for index, output in self._rows])}
+            for column in COLUMNS:
+                array = np.full((len(self._rows), lengths.max()), np.nan)
+                for i, (index, output) in enumerate(self._rows):
+                    array[i, :lengths[i]] = output[column]
+                arrays[column] = array
+            np.savez(path, **arrays)
+        elif self.format == 'parquet':
+            import pyarrow, pyarrow.parquet
+            table = {'index': np.repeat(indices, lengths)}
+            for column in COLUMNS:
+                table[column] = np.concatenate([output[column] for index, output in self._rows])
+            pyarrow.parquet.write_table(pyarrow.table(table), path)
+        else:
+            with open(path, 'w') as file:
+                for index, output in self._rows:
+                    file.write(json_record(index, output) + '\n')
+        self.shards += 1
+        self._rows = []
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='modtran',
+        description="Runs batches of MODTRAN cases on RIT's Center for Imaging Science Linux servers. "
+                    "Each input line (JSON object) or CSV row holds keyword arguments of modtran.run.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="JSON-lines or CSV file of parameter sets, or '-' for stdin (default)")
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'], default=None,
+                        help="format of the input (default: from the file extension, jsonl for stdin)")
+    parser.add_argument('-o', '--output', default=None,
+                        help="directory to write result shards to (default: JSON lines on stdout)")
+    parser.add_argument('--format', choices=['npz', 'parquet', 'jsonl'], default=None,
+                        help="format of the result shards (default: npz, or jsonl on stdout without --output)")
+    parser.add_argument('--shard-size', type=int, default=100,
+                        help="number of cases per shard (default: 100)")
+    parser.add_argument('-u', '--username', default=os.environ.get('MODTRAN_USERNAME', os.environ.get('USER')),
+                        help="CIS username (default: $MODTRAN_USERNAME, then $USER)")
+    parser.add_argument('--password-env', default=None, metavar='VARIABLE',
+                        help="environment variable holding the CIS password (default: log in with a key or agent)")
+    parser.add_argument('-i', '--key', default=None, dest='key_filename',
+                        help="private key file to log in with (default: SSH agent and ~/.ssh keys)")
+    parser.add_argument('--host', action='append', default=None, dest='hosts',
+                        help="CIS host to run on, may be repeated (default: grissom.cis.rit.edu)")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="number of cases run at the same time on each host (default: 1)")
+    parser.add_argument('--prefix', default=None,
+                        help="name of the workspace directories on the server "
+                             "(default: unique to this process, modtran-temp-<local host>-<pid>)")
+    parser.add_argument('--store', default=None,
+                        help="result store (SQLite file) to reuse and record results")
+    parser.add_argument('--verbose', action='store_true',
+                        help="echo MODTRAN's screen output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Entry point of the 'modtran' console script, type 'modtran --help' for usage"""
+    arguments = parse_arguments(argv)
+    password = None
+    if arguments.password_env is not None:
+        password = os.environ.get(arguments.password_env)
+        if password is None:
+            print("modtran: environment variable " + arguments.password_env + " is not set", file=sys.stderr)
+            return 2
+
+    if arguments.format is None:
+        arguments.format = 'jsonl' if arguments.output is None else 'npz'
+    try:
+        writer = ShardWriter(arguments.output, arguments.format, arguments.shard_size)
+    except (ImportError, ValueError) as error:
+        print("modtran: " + str(error), file=sys.stderr)
+        return 2
+    if arguments.input_format is None:
+        arguments.input_format = 'csv' if arguments.input.lower().endswith('.csv') else 'jsonl'
+    try:
+        cases = read_cases(arguments.input, arguments.input_format)
+    except (OSError, ValueError) as error:
+        print("modtran: " + str(error), file=sys.stderr)
+        return 2
+
+    # Invalid parameter sets are reported as failures without stopping the batch, and
+    # messages (e.g. truncation warnings) go to stderr so that stdout only carries results
+    failures = []
+    params = []
+    indices = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        for index, case in enumerate(cases):
+            try:
+                case = Parameters(**(csv_case(case) if arguments.input_format == 'csv' else case))
+            except (TypeError, ValueError) as error:
+                failures.append(([index], error))
+                print('INVALID CASE (INPUT ' + str(index) + '): ' + str(error), file=sys.stderr)
+                continue
+            params.append(case)
+            indices.setdefault(case, []).append(index)
+    total = len(params) + len(failures)
+
+    completed = []
+
+    def callback(case, output):
+        for index in indices[case]:
+            writer.write(index, output)
+        completed.append(case)
+
+    def on_error(case, error):
+        failures.append((indices[case], error))
+        print('FAILED CASE (INPUT ' + ', '.join(map(str, indices[case])) + '): ' + str(error), file=sys.stderr)
+
+    # Results of finished cases are written and the summary printed even if the batch stops
+    # early, e.g. when a host cannot be reached or the login fails
+    store = ResultStore(arguments.store) if arguments.store is not None else None
+    start_time = time.time()
+    connection_error = None
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            run_batch(arguments.username, password, params,
+                      hostname=arguments.hosts or 'grissom.cis.rit.edu',
+                      workers=arguments.workers,
+                      quiet=not arguments.verbose,
+                      store=store,
+                      callback=callback,
+                      on_error=on_error,
+                      key_filename=arguments.key_filename,
+                      prefix=arguments.prefix)
+    except (paramiko.SSHException, OSError, RuntimeError) as error:  # failed login or workspace setup
+        connection_error = error
+    finally:
+        writer.close()
+        elapsed = time.time() - start_time
+        failed = sum(len(index) for index, error in failures)
+        print('COMPLETED ' + str(sum(len(indices[case]) for case in completed)) + ' OF ' + str(total) +
+              ' CASES (' + str(len(completed)) + ' UNIQUE) IN ' + str(round(elapsed, 1)) + ' s, ' +
+              str(round(len(completed) / max(elapsed, 1e-9) * 60, 1)) + ' UNIQUE CASES/MIN, ' +
+              str(failed) + ' FAILED', file=sys.stderr)
+        if arguments.output is not None:
+            print('    ' + str(writer.shards) + ' SHARDS WRITTEN TO ' + arguments.output, file=sys.stderr)
+    if connection_error is not None:
+        print("modtran: could not run on the server: " + (str(connection_error) or type(connection_error).__name__),
+              file=sys.stderr)
+        return 2
+    return 1 if failures else 0
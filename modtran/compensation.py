@@ -0,0 +1,265 @@
+# Converts at-sensor radiance image cubes to surface reflectance or emissivity
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+INTERLEAVES = {
+    #NAME     AXES (rows, columns, bands) of the cube
+    'bip':    (0, 1, 2),   # band interleaved by pixel, shape (rows, columns, bands)
+    'bil':    (0, 2, 1),   # band interleaved by line, shape (rows, bands, columns)
+    'bsq':    (1, 2, 0),   # band sequential, shape (bands, rows, columns)
+}
+
+
+def resample(output: dict, wavelengths, fwhm=None, columns: list = None) -> dict:
+    '''
+    Resamples the columns of a MODTRAN output dictionary to sensor bands centered at
+    wavelengths [micron].  If fwhm [micron] is given, each band is a Gaussian spectral
+    response with that full-width-half-maximum, otherwise the columns are interpolated.
+    '''
+    if columns is None:
+        columns = ['TRANS', 'PTH THRML', 'THRML SCT', 'SURF EMIS', 'SOL SCAT', 'GRND RFLT', 'DRCT RFLT', 'TOTAL RAD']
+    grid = np.asarray(output['WAVELEN MCRN'], dtype=float)
+    order = np.argsort(grid)
+    grid = grid[order]
+    wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+    if fwhm is None:
+        return {column: np.interp(wavelengths, grid, np.asarray(output[column], dtype=float)[order])
+                for column in columns}
+    sigma = np.broadcast_to(np.asarray(fwhm, dtype=float), wavelengths.shape) / (2 * np.sqrt(2 * np.log(2)))
+    weights = np.exp(-0.5 * ((grid[None, :] - wavelengths[:, None]) / sigma[:, None]) ** 2)
+    total = weights.sum(axis=1)
+    if np.any(total == 0):
+        raise ValueError("Sensor bands must overlap the MODTRAN wavelength range " +
+                         str(grid[0]) + "-" + str(grid[-1]) + " micron")
+    weights /= total[:, None]
+    return {column: weights @ np.asarray(output[column], dtype=float)[order] for column in columns}
+
+
+def planck(wavelengths, temperature):
+    '''
+    Blackbody radiance [W/cm2/sr/micron] at wavelengths [micron] and temperature [K]
+    '''
+    c1 = 1.191042e4   # 2hc^2 [W micron^4 / cm2 / sr]
+    c2 = 1.4387769e4  # hc/k [micron K]
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    with np.errstate(over='ignore'):
+        return c1 / (wavelengths ** 5 * np.expm1(c2 / (wavelengths * np.asarray(temperature, dtype=float))))
+
+
+def surface_reflectance(output: dict) -> float:
+    '''
+    Returns the SURREF a MODTRAN output was run with, read from its tape5
+    '''
+    return float(output['tape5'].split('\n')[0][-6:])
+
+
+def coefficients(output: dict, wavelengths, fwhm=None, mode: str = 'reflectance', SURREF: float = None) -> tuple:
+    '''
+    Returns (offset, gain) per sensor band such that radiance = offset + gain * surface term.
+
+    For mode = 'reflectance' the surface term is reflectance: the offset is the path radiance
+    (SOL SCAT + PTH THRML) and the gain is the ground-reflected radiance per unit reflectance
+    (GRND RFLT / SURREF).  SURREF defaults to the value in the output's tape5.
+
+    For mode = 'emissivity' the surface term is emissivity times surface blackbody radiance:
+    the offset is PTH THRML and the gain is TRANS.  Radiance reflected from the surface is
+    neglected.
+    '''
+    terms = resample(output, wavelengths, fwhm, ['TRANS', 'PTH THRML', 'SOL SCAT', 'GRND RFLT'])
+    if mode == 'reflectance':
+        if SURREF is None:
+            SURREF = surface_reflectance(output)
+        if SURREF <= 0:
+            raise ValueError("MODTRAN run must use SURREF > 0 to compute reflectance")
+        return terms['SOL SCAT'] + terms['PTH THRML'], terms['GRND RFLT'] / SURREF
+    elif mode == 'emissivity':
+        return terms['PTH THRML'], terms['TRANS']
+    raise ValueError("Invalid mode " + str(mode) + ", must be 'reflectance' or 'emissivity'")
+
+
+def albedo_coefficients(outputs: list, wavelengths, fwhm=None) -> tuple:
+    '''
+    Returns (offset, gain, albedo) per sensor band from runs of one case at two or more
+    SURREF values, such that radiance = offset + gain * r / (1 - albedo * r) for surface
+    reflectance r.  The ground-reflected radiance (GRND RFLT) includes light reflected
+    back down by the atmosphere, so it grows faster than linearly with reflectance;
+    albedo is the atmosphere's spherical albedo fitted to it by least squares.
+    '''
+    reflectances = np.array([surface_reflectance(output) for output in outputs])
+    if len(np.unique(reflectances)) < 2 or np.any(reflectances <= 0):
+        raise ValueError("Need MODTRAN runs at two or more different SURREF > 0, got " + str(list(reflectances)))
+    terms = [resample(output, wavelengths, fwhm, ['PTH THRML', 'SOL SCAT', 'GRND RFLT']) for output in outputs]
+    offset = np.mean([term['SOL SCAT'] + term['PTH THRML'] for term in terms], axis=0)
+
+    # GRND RFLT = gain * r / (1 - albedo * r) is linear in (gain, albedo): r * gain + r * GRND RFLT * albedo = GRND RFLT
+    ground = np.array([term['GRND RFLT'] for term in terms])                         # (runs, bands)
+    design = np.stack([np.broadcast_to(reflectances[:, None], ground.shape), reflectances[:, None] * ground], axis=-1)
+    design = np.moveaxis(design, 0, 1)                                               # (bands, runs, 2)
+    solution = np.linalg.solve(np.einsum('brk,brl->bkl', design, design),
+                               np.einsum('brk,rb->bk', design, ground)[:, :, None])[:, :, 0]
+    return offset, solution[:, 0], solution[:, 1]
+
+
+def compensate(cube,
+               wavelengths,
+               outputs,
+               fwhm = None,
+               mode: str = 'reflectance',
+               parameter_map = None,
+               temperature = None,
+               scale: float = 1.0,
+               interleave: str = 'bip',
+               out = None,
+               block_rows: int = 64,
+               workers: int = 4,
+    ) -> np.ndarray:
+    """Inverts an at-sensor radiance cube to surface reflectance or emissivity, block by block.
+
+
+    Required Arguments:
+
+    cube : array
+        Radiance cube, usually a numpy.memmap so that only the blocks being processed are
+        read into memory
+
+    wavelengths : array
+        Center wavelength [micron] of each band
+
+    outputs : dict or list
+        Either one MODTRAN output dictionary (from modtran.run), used for every pixel, or a
+        lookup table {key: output} selected per pixel by parameter_map.
+
+        With one output per case, reflectance assumes the ground-reflected radiance is
+        linear in reflectance (GRND RFLT / SURREF), a single-albedo approximation: light
+        reflected back to the ground by the atmosphere scales as r / (1 - S r) (S is the
+        spherical albedo), so reflectances far from the run's SURREF are biased, most in
+        hazy or blue bands.  To remove this, give a list of outputs of the same case run at
+        two or more SURREF values (e.g. 0.1 and 0.8) in place of each output; S is then
+        fitted per band (see albedo_coefficients).
+    __________________________________________________________________________________________
+
+    Keyword Arguments:
+
+    fwhm : float or array or None
+        Full-width-half-maximum [micron] of each band's Gaussian spectral response.  If None,
+        the MODTRAN outputs are interpolated to the band centers.
+        Default setting is None
+
+    mode : str
+        'reflectance' - surface reflectance using the solar terms
+        'emissivity' - surface emissivity using the thermal terms (requires temperature)
+        Default setting is 'reflectance'
+
+    parameter_map : array or None
+        Array of shape (rows, columns) holding each pixel's key into outputs
+        Default setting is None
+
+    temperature : float or array or None
+        Surface temperature [K] for mode = 'emissivity', either one value or an array of
+        shape (rows, columns)
+        Default setting is None
+
+    scale : float
+        Factor converting the cube's values to W/cm2/sr/micron
+        Default setting is 1.0
+
+    interleave : str
+        Layout of cube (and of the result): 'bip' (rows, columns, bands),
+        'bil' (rows, bands, columns) or 'bsq' (bands, rows, columns)
+        Default setting is 'bip'
+
+    out : array or str or None
+        Array to write the result into, or the path of a .npy file to create as a memory
+        map.  If None, a float32 array is allocated in memory.
+        Default setting is None
+
+    block_rows : int
+        Number of image rows inverted at a time by each worker
+        Default setting is 64
+
+    workers : int
+        Number of blocks inverted in parallel
+        Default setting is 4
+    __________________________________________________________________________________________
+
+    Returns:
+
+    out : array
+        Reflectance or emissivity cube with the same shape and interleave as cube
+    """
+    if interleave not in INTERLEAVES:
+        raise ValueError("Invalid interleave " + str(interleave) + ", must be one of " + str(list(INTERLEAVES)))
+    axes = INTERLEAVES[interleave]
+    rows, columns, bands = [cube.shape[axis] for axis in axes]
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    if len(wavelengths) != bands:
+        raise ValueError("Cube has " + str(bands) + " bands but " + str(len(wavelengths)) + " wavelengths were given")
+    if mode == 'emissivity' and temperature is None:
+        raise ValueError("Surface temperature is required for mode = 'emissivity'")
+
+    def entry_coefficients(entry):
+        if isinstance(entry, (list, tuple)):
+            if mode != 'reflectance':
+                raise ValueError("Outputs at several SURREF values are only used for mode = 'reflectance'")
+            return albedo_coefficients(entry, wavelengths, fwhm)
+        offset, gain = coefficients(entry, wavelengths, fwhm, mode)
+        return offset, gain, np.zeros_like(gain)
+
+    # Resample every MODTRAN output to the sensor bands once
+    if parameter_map is None:
+        keys = np.array([0])
+        offsets, gains, albedos = [array[None, :] for array in entry_coefficients(outputs)]
+    else:
+        parameter_map = np.asarray(parameter_map)
+        if parameter_map.shape != (rows, columns):
+            raise ValueError("Parameter map must have shape " + str((rows, columns)))
+        keys = np.array(sorted(outputs))
+        offsets, gains, albedos = map(np.array, zip(*[entry_coefficients(outputs[key]) for key in keys]))
+    if temperature is not None and np.ndim(temperature) > 0:
+        temperature = np.asarray(temperature, dtype=float)
+        if temperature.shape != (rows, columns):
+            raise ValueError("Temperature map must have shape " + str((rows, columns)))
+
+    if out is None:
+        out = np.empty(cube.shape, dtype=np.float32)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=np.float32, shape=cube.shape)
+    elif out.shape != cube.shape:
+        raise ValueError("Output array must have shape " + str(cube.shape))
+
+    def block_slice(start, stop):
+        index = [slice(None)] * 3
+        index[axes[0]] = slice(start, stop)
+        return tuple(index)
+
+    def invert(start):
+        stop = min(start + block_rows, rows)
+        index = block_slice(start, stop)
+        radiance = np.transpose(np.asarray(cube[index], dtype=np.float64), axes) * scale  # (rows, columns, bands)
+
+        if parameter_map is None:
+            i = np.zeros(radiance.shape[:2], dtype=int)
+        else:
+            block_keys = parameter_map[start:stop]
+            i = np.searchsorted(keys, block_keys)
+            i = np.minimum(i, len(keys) - 1)
+            if np.any(keys[i] != block_keys):
+                raise KeyError("Parameter map values " + str(np.setdiff1d(block_keys, keys)) + " are not in outputs")
+
+        gain = gains[i]
+        if mode == 'emissivity':
+            T = temperature[start:stop, :, None] if np.ndim(temperature) > 0 else temperature
+            gain = gain * planck(wavelengths, T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difference = radiance - offsets[i]
+            surface = difference / (gain + albedos[i] * difference)
+        surface[~np.isfinite(surface)] = np.nan
+        out[index] = np.transpose(surface, np.argsort(axes))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(invert, range(0, rows, block_rows)))
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
@@ -0,0 +1,193 @@
+# Predicts MODTRAN runtimes from observed runs and schedules batches longest-job-first
+
+import heapq
+import json
+import os
+import threading
+from types import SimpleNamespace
+import numpy as np
+from modtran.parameters import Parameters, to_parameters
+
+
+DEFAULT_RUNTIME_LOG = os.path.join(os.path.expanduser('~'), '.modtran', 'runtimes.jsonl')
+"""
+File where observed runtimes are recorded by default, one JSON object per line
+"""
+
+MAX_RECORDS = 5000
+"""
+Number of most recent runtimes kept in the runtime log, which is compacted when it grows to
+twice this length
+"""
+
+FEATURE_INPUTS = ['MODTRN', 'SPEED', 'DIS', 'DISAZM', 'NSTR', 'V1', 'V2', 'DV']
+"""
+Inputs the features depend on, the only inputs stored in the runtime log
+"""
+
+FEATURES = [
+    #NAME                   PRIOR COEFFICIENT (on log-runtime)
+    ('constant',            -1.0),
+    ('correlated-k',         2.0),   # MODTRN = 'C' or 'K'
+    ('correlated-k slow',    0.6),   # MODTRN = 'C' or 'K' with SPEED = 'S'
+    ('DISORT',               0.5),   # DIS = 'T'
+    ('DISORT streams',       0.4),   # log2(NSTR) with DIS = 'T'
+    ('DISORT azimuth',       0.3),   # DISAZM = 'T' with DIS = 'T'
+    ('scaled DISORT',        0.2),   # DIS = 'S'
+    ('spectral span',        0.2),   # log of the span of wavenumbers [cm-1] computed by MODTRAN
+    ('spectral points',      0.05),  # log of the number of output points (V2 - V1) / DV
+]
+"""
+Runtime is modeled as log(runtime [s]) = features(params) . coefficients.  The prior
+coefficients are used until enough runs have been recorded to fit them.
+"""
+
+
+def features(params: Parameters) -> np.ndarray:
+    '''
+    Returns the feature vector (see FEATURES) used to predict the runtime of params (or any
+    object with the attributes in FEATURE_INPUTS)
+    '''
+    correlated_k = params.MODTRN in ['C', 'K']
+    disort = params.DIS == 'T'
+    v1, v2 = sorted([max(params.V1, 0.2), max(params.V2, 0.2)])  # MODTRAN starts at 0.2 micron
+    span = 1e4 / v1 - 1e4 / v2
+    points = max((params.V2 - params.V1) / params.DV, 1.0) if params.DV > 0 else 1.0
+    return np.array([
+        1.0,
+        correlated_k,
+        correlated_k and params.SPEED == 'S',
+        disort,
+        disort * np.log2(params.NSTR),
+        disort and params.DISAZM == 'T',
+        params.DIS == 'S',
+        np.log1p(span),
+        np.log(points),
+    ], dtype=float)
+
+
+class CostModel:
+    """Predicts the runtime of MODTRAN cases from previously recorded runs.
+
+    path : str or None
+        JSON-lines file of recorded runtimes.  The last MAX_RECORDS valid records are
+        loaded (malformed lines, e.g. from an interrupted write, are skipped) and new
+        records are appended.  Set to None to keep records in memory only.
+        Default setting is DEFAULT_RUNTIME_LOG (~/.modtran/runtimes.jsonl)
+
+    regularization : float
+        Weight pulling the fitted coefficients toward the prior coefficients in FEATURES.
+        Default setting is 1.0
+    """
+
+    def __init__(self, path: str = DEFAULT_RUNTIME_LOG, regularization: float = 1.0):
+        self.path = path
+        self.regularization = regularization
+        self.prior = np.array([coefficient for name, coefficient in FEATURES])
+        self.coefficients = self.prior.copy()
+        self._features = []
+        self._runtimes = []
+        self._fitted = True
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self._runtimes)
+
+    def _add(self, params, runtime):
+        self._features.append(features(params))
+        self._runtimes.append(runtime)
+        self._fitted = False
+
+    def _load(self):
+        with open(self.path) as file:
+            lines = file.readlines()
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+                inputs = record['inputs'] if 'inputs' in record else record['params']  # older logs
+                inputs = {name: inputs[name] for name in FEATURE_INPUTS}
+                runtime = float(record['runtime'])
+                vector = features(SimpleNamespace(**inputs))
+            except (ValueError, KeyError, TypeError, AttributeError, ZeroDivisionError):
+                continue
+            if np.isfinite(runtime) and runtime > 0 and np.all(np.isfinite(vector)):
+                records.append((inputs, runtime, vector))
+        records = records[-MAX_RECORDS:]
+        for inputs, runtime, vector in records:
+            self._features.append(vector)
+            self._runtimes.append(runtime)
+        self._fitted = not records
+
+        # Rewrite the log without old, malformed or surplus lines once it grows too long
+        if len(lines) > 2 * MAX_RECORDS:
+            temporary = self.path + '.' + str(os.getpid()) + '.tmp'
+            with open(temporary, 'w') as file:
+                for inputs, runtime, vector in records:
+                    file.write(json.dumps({'inputs': inputs, 'runtime': runtime}) + '\n')
+            os.replace(temporary, self.path)
+
+    def record(self, case, runtime: float):
+        '''
+        Records the observed runtime [s] of a case (Parameters or dictionary of inputs)
+        '''
+        params = to_parameters(case)
+        with self._lock:
+            self._add(params, runtime)
+            if self.path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a') as file:
+                    inputs = {name: getattr(params, name) for name in FEATURE_INPUTS}
+                    file.write(json.dumps({'inputs': inputs, 'runtime': runtime}) + '\n')
+
+    def fit(self) -> np.ndarray:
+        '''
+        Fits the coefficients to the recorded runtimes (ridge regression toward the prior)
+        and returns them
+        '''
+        with self._lock:
+            if not self._fitted:
+                X = np.array(self._features).reshape(-1, len(FEATURES))
+                y = np.log(np.maximum(self._runtimes, 1e-3))
+                penalty = self.regularization * np.eye(len(FEATURES))
+                self.coefficients = np.linalg.solve(X.T @ X + penalty,
+                                                    X.T @ y + penalty @ self.prior)
+                self._fitted = True
+            return self.coefficients
+
+    def predict(self, case) -> float:
+        '''
+        Returns the predicted runtime [s] of a case (Parameters or dictionary of inputs)
+        '''
+        return float(np.exp(features(to_parameters(case)) @ self.fit()))
+
+
+def schedule(cases: list, workers: int = 1, cost_model: CostModel = None) -> tuple:
+    '''
+    Orders cases longest-processing-time-first for the given number of parallel workers.
+    Returns (order, makespan) where order is the list of case indices in the order they
+    should be dispatched and makespan is the predicted time [s] to finish all cases.
+    '''
+    if workers < 1:
+        raise ValueError("Number of workers must be at least 1")
+    if cost_model is None:
+        cost_model = CostModel()
+    runtimes = [cost_model.predict(case) for case in cases]
+    order = sorted(range(len(cases)), key=lambda i: runtimes[i], reverse=True)
+
+    # Each case is dispatched to the first worker to become free
+    finish_times = [0.0] * min(workers, max(len(cases), 1))
+    for i in order:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + runtimes[i])
+    return order, max(finish_times)
+
+
+def estimate(cases: list, workers: int = 1, cost_model: CostModel = None) -> float:
+    '''
+    Returns the predicted time [s] to run a list of cases (Parameters or dictionaries of
+    inputs) on the given number of parallel workers, after removing duplicate cases
+    '''
+    unique = list(dict.fromkeys(to_parameters(case) for case in cases))
+    return schedule(unique, workers, cost_model)[1]
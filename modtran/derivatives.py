@@ -0,0 +1,178 @@
+# Finite-difference derivatives of MODTRAN outputs with respect to continuous inputs
+
+import numpy as np
+from modtran.batch import run_batch
+from modtran.parameters import FLOAT_FORMATS, input_value, to_parameters, with_input
+
+
+ZERO_STEP = 0.01
+"""
+Default step for inputs whose value is 0 (e.g. GNDALT or H2), where a relative step vanishes
+"""
+
+LIMITS = {
+    'H2OSTR': (0, None), 'O3STR': (0, None), 'CO2MX': (0, None), 'VIS': (0, None), 'WSS': (0, None),
+    'WHH': (0, None), 'RAINRT': (0, None), 'GNDALT': (0, None), 'H1': (0, None), 'H2': (0, None),
+    'ANGLE': (0, 180), 'ANGLEM': (0, 180), 'PARM1': (0, 360), 'PARM2': (0, 180), 'SURREF': (0, 1), 'G': (0, 1),
+}
+"""
+(lower, upper) limits of inputs, None if unbounded.  Inputs are never perturbed outside their
+limits (one-sided differences are used instead).
+"""
+
+
+def step_size(params, name: str, relative_step: float = 0.01, step: float = None) -> float:
+    '''
+    Returns a finite-difference step for input name that is a whole number of the smallest
+    increments written to tape5 (e.g. 0.001 for PARM2), so the step is not truncated away
+    '''
+    decimals = FLOAT_FORMATS[name][1] if name in FLOAT_FORMATS else 4
+    resolution = 10.0 ** -decimals
+    if step is None:
+        value = input_value(params, name)[1]
+        step = relative_step * abs(value) if value != 0 else ZERO_STEP
+    return max(round(step / resolution), 1) * resolution
+
+
+def perturb(params, name: str, value: float):
+    '''
+    Returns a copy of params with input name set to value, or None if that value is invalid
+    '''
+    lower, upper = LIMITS.get(name, (None, None))
+    if (lower is not None and value < lower) or (upper is not None and value > upper):
+        return None
+    try:
+        return with_input(params, name, value)
+    except (TypeError, ValueError):
+        return None
+
+
+def jacobian(username: str,
+             password: str,
+             base,
+             inputs: list,
+             columns: list = None,
+             steps: dict = None,
+             relative_step: float = 0.01,
+             central: bool = True,
+             hostname = 'grissom.cis.rit.edu',
+             workers: int = 1,
+    ) -> dict:
+    """Computes derivatives of MODTRAN output columns with respect to continuous inputs.
+
+    All baseline and perturbed cases (for every operating point) are run as a single
+    deduplicated batch with modtran.run_batch, so baselines and one-sided steps shared
+    between inputs are only run once.
+
+
+    Required Arguments:
+
+    username : str
+        Your CIS username
+
+    password : str
+        Your CIS password
+
+    base : modtran.Parameters or dict, or list of them
+        Operating point(s) at which the derivatives are computed
+
+    inputs : list of str
+        Continuous inputs to differentiate with respect to, e.g. ['H2OSTR', 'VIS', 'PARM2'].
+        H2OSTR and O3STR must be set to a number (in any units), not '0'.
+    __________________________________________________________________________________________
+
+    Keyword Arguments:
+
+    columns : list of str
+        tape7.scn columns to differentiate
+        Default setting is ['TOTAL RAD']
+
+    steps : dict
+        Absolute step for some inputs, e.g. {'PARM2': 0.5}.  Steps are rounded to a whole
+        number of the smallest increments written to tape5.
+        Default setting is {}
+
+    relative_step : float
+        Step for the other inputs, as a fraction of their value (ZERO_STEP if the value is 0)
+        Default setting is 0.01
+
+    central : bool
+        True - central differences, falling back to one-sided differences where a step
+               would leave the valid range of an input
+        False - forward differences
+        Default setting is True
+
+    hostname : str or list of str
+        Name of CIS host(s), see 'help(modtran.run_batch)'
+        Default setting is grissom.cis.rit.edu
+
+    workers : int
+        Number of cases run at the same time on each host
+        Default setting is 1
+    __________________________________________________________________________________________
+
+    Returns:
+
+    output : dict
+        Output dictionary with the following keys:
+            'WAVELEN MCRN'  - wavelength [micron]
+            'inputs'        - names of the inputs
+            'columns'       - names of the columns
+            'jacobian'      - derivatives, array of shape (inputs, wavelengths, columns), or
+                              (points, inputs, wavelengths, columns) if base is a list
+            'steps'         - difference between the upper and lower values of each input
+                              actually written to tape5, shape (inputs,) or (points, inputs)
+            'baseline'      - output dictionary of the operating point(s)
+    """
+    if columns is None:
+        columns = ['TOTAL RAD']
+    if steps is None:
+        steps = {}
+    points = [to_parameters(case) for case in base] if isinstance(base, (list, tuple)) else [to_parameters(base)]
+
+    # Plan the lower and upper case for every input at every point
+    plan = []
+    for params in points:
+        for name in inputs:
+            units, value = input_value(params, name)
+            if name in ['H2OSTR', 'O3STR'] and getattr(params, name) == '0':
+                raise ValueError("Set " + name + " to a number to differentiate with respect to it")
+            h = step_size(params, name, relative_step, steps.get(name))
+            upper = perturb(params, name, value + h)
+            lower = perturb(params, name, value - h) if central else params
+            if upper is None and lower is None:
+                raise ValueError("Cannot perturb " + name + " = " + str(value) + " by " + str(h))
+            if all(case is None or input_value(case, name)[1] == value for case in (upper, lower)):
+                raise ValueError("Input " + name + " is ignored by MODTRAN for the selected options and " +
+                                 "reset to " + str(value) + " (type 'help(modtran.run)' for when it is used)")
+            upper = params if upper is None else upper
+            lower = params if lower is None else lower
+            span = input_value(upper, name)[1] - input_value(lower, name)[1]
+            if span == 0:
+                raise ValueError("Step for " + name + " vanishes when written to tape5, increase it")
+            plan.append((lower, upper, span))
+
+    cases = points + [case for lower, upper, span in plan for case in (lower, upper)]
+    outputs = dict(zip(cases, run_batch(username, password, cases, hostname, workers)))
+
+    derivatives = np.array([
+        np.stack([(np.asarray(outputs[upper][column]) - np.asarray(outputs[lower][column])) / span
+                  for column in columns], axis=-1)
+        for lower, upper, span in plan
+    ]).reshape(len(points), len(inputs), -1, len(columns))
+    spans = np.array([span for lower, upper, span in plan]).reshape(len(points), len(inputs))
+    baselines = [outputs[params] for params in points]
+
+    result = {}
+    result['WAVELEN MCRN'] = baselines[0]['WAVELEN MCRN']
+    result['inputs'] = list(inputs)
+    result['columns'] = list(columns)
+    if isinstance(base, (list, tuple)):
+        result['jacobian'] = derivatives
+        result['steps'] = spans
+        result['baseline'] = baselines
+    else:
+        result['jacobian'] = derivatives[0]
+        result['steps'] = spans[0]
+        result['baseline'] = baselines[0]
+    return result
@@ -1,5 +1,7 @@
 # Puts MODTRAN inputs into format required for tape5 file
 
+from decimal import Decimal
+
 def A(text, n):
     '''
     Re-formats the string 'text' to an n-length string, right-justified
@@ -32,7 +34,12 @@ def F(number, n, d):
     '''
     if (type(number) != float and type(number) != int):
         raise TypeError("Argument " + str(number) + " must be a float or integer")
-    num, dec = str(number).split('.')
+    text = str(number)
+    if 'e' in text or 'E' in text:  # e.g. 1e-05, written in fixed-point notation instead
+        text = format(Decimal(text), 'f')
+    if '.' not in text:
+        text += '.0'
+    num, dec = text.split('.')
     if len(dec) > d:  # truncate
         print("WARNING: truncating " + str(number) + " to " + str(d) + " decimal places")
     elif len(dec) < d:  # add trailing zeros
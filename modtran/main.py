@@ -1,14 +1,14 @@
-import numpy as np
-import paramiko
-import subprocess
-import os
-import time
-from modtran.formats import A, I, F
+from modtran import broker
+from modtran.parameters import Parameters
+from modtran.session import Session
 
 
 def run(username: str,                         # CIS username
         password: str,                         # CIS password
         hostname: str = 'grissom.cis.rit.edu', # Name of CIS host
+        quiet: bool = False,                   # Only capture MODTRAN's screen output
+        progress = None,                       # Callback for progress events
+        store = None,                          # Result store to reuse earlier runs
 
         # DEFAULT ARGUMENTS
         MODTRN : str   = 'M',    # MODTRAN band model
@@ -61,6 +61,21 @@ def run(username: str,                         # CIS username
     hostname : str
         Name of CIS host
         Default setting is grissom.cis.rit.edu
+
+    quiet : bool
+        False - echo MODTRAN's screen output to the console
+        True - only capture MODTRAN's screen output (see 'stdout' and 'stderr' below)
+        Default setting is False
+
+    progress : callable or None
+        Called with a modtran.Progress event (fraction, wavenumber, line) each time
+        MODTRAN reports the wavenumber it is working on
+        Default setting is None
+
+    store : modtran.ResultStore or None
+        If the case is already in the store, its stored output is returned without
+        running MODTRAN.  Otherwise the new output is added to the store.
+        Default setting is None
     __________________________________________________________________________________________
 
     Keyword Arguments:
@@ -328,492 +343,115 @@ def run(username: str,                         # CIS username
             'REF SOL'       - # TODO: define 'REF SOL'
             'SOL@OBS'       - # TODO: define 'SOL@OBS'
             'DEPTH'         - # TODO: define 'DEPTH'
-    """
-
-    # Define fixed MODTRAN Parameters (hidden from user to
-    # prevent unintended behavior)
-
-    ITYPE : int = 2
-    """
-    Vertical or slant path between two arbitrary altitudes
-    """
-
-    IEMSCT : int = 2
-    """
-    Radiance mode, includes solar/lunar radiance
-    """
-
-    IMULT : int = -1
-    """
-    Multiple scattering enabled - solar geometry is w/r to H2 (target/ground)
-    """
-
-    M1, M2, M3, M4, M5, M6 = [0, 0, 0, 0, 0, 0]
-    """
-    Uses the default atmospheric constituents for the corresponding
-    MODEL atmosphere
-    """
-
-    MDEF : int = 1
-    """
-    Default heavy species profiles are used (user-defined heavy species
-    profiles are not supported by this API)
-    """
-
-    IM : int = 0
-    """
-    Normal operation (user-defined atmospheres are not supported by this API)
-    """
-
-    NOPRNT : int = 0
-    """
-    Normal tape6 output
-    """
-
-    LSUN : str = 'T'
-    """
-    Read in 1 cm-1 binned solar irradiance from a file (see LSUNFL)
-    """
-
-    ISUN : int = 10
-    """
-    The full-width-half-maximum (in cm-1) of the triangular scanning function
-    used to smooth the top-of-atmosphere solar irradiance
-    """
-
-    LSUNFL : str = 'F'
-    """
-    Use the default solar radiance file, DATA/newkur.dat
-    """
-
-    LBMNAM : str = 'F'
-    """
-    Use the default band model file, DATA/B2001_01.BIN
-    """
-
-    LFLTNM : str = 'F'
-    """
-    Do not read in user-defined instrument filter function
-    """
-
-    H2OAER : str = 'T'
-    """
-    Aerosol optical properties are modified to reflect the changes
-    from the original relative humidity profile arising from the
-    scaling of the water column (H2OSTR).
-    """
-
-    LDATDR : str = ''
-    """
-    Use the default data directory: DATA/
-    Note that 'F' returns a read error for some reason, so keep this as ''
-    """
-
-    SOLCON : int = 0
-    """
-    Do not scale the TOA solar irradiance
-    """
-
-    APLUS : str = ''
-    """
-    Do not include user-specified aerosol optical properties (not currently
-    supported by this API)
-    """
-
-    ARUSS : str = ''
-    """
-    Do not use user-supplied aerosol spectra (not currently supported by this API).
-    """
-
-    ICLD : int = 0
-    """
-    Cloud/rain model
-        0 - no clouds or rain
-        1 - cumulus cloud layer, base = 0.66 km, top = 3.0 km
-        2 - altostratus cloud layer, base = 2.4 km, top = 3.0 km
-        3 - stratus cloud layer, base = 0.33 km, top = 3.0 km
-        4 - stratus/stratocumulus layer, base = 0.66 km, top = 2.0 km
-        5 - nimbostratus cloud layer, base = 0.16 km, top = 0.66 km
-        6 - 2.0 mm/hr ground drizzle (cloud 3)
-        7 - 5.0 mm/hr ground light rain (cloud 5)
-        8 - 12.5 mm/hr ground moderate rain (cloud 5)
-        9 - 25.0 mm/hr ground heavy rain (cloud 1)
-        10 - 75.0 mm/hr ground extreme rain (cloud 1)
-        11 = user defined cloud extinction
-        18 - standard cirrus model
-        19 - sub-visual cirrus model
-        Note: options 12-17 are not used by MODTRAN.
-        Note: since cloud models > 0 require card 2A and I can't find documentation about
-        the format of card 2A, I'm disabling cloud models.
-    """
-
-    RANGE : float = 0.0
-    """
-    Path length [km] between H1 and H2
-    Set to 0.0 to force CASE 2a (p. 49 of manual)
-    """
-
-    BETA : float = 0.0
-    """
-    Earth-center angle [deg] subtended by H1 and H2
-    Set to 0.0 to force CASE 2a (p. 49 of manual)
-    """
-
-    RO : str = ''
-    """
-    Radius of the earth [km]
-    Set to '' for default
-    """
-
-    LENN : int = 1
-    """
-    0 - short (stops at tangent height)
-    1 - long (extends through the tangent height)
-    """
-
-    PHI : float = 0.0
-    """
-    Zenith angle [deg] measured from H2 toward H1
-    Set to 0.0 to force CASE 2a (p. 49 of manual)
-    """
-
-    IPARM : int = 12
-    """
-    Method of specifying geometry
-    Set to 12 so that the parameters are:
-        PARM1 - solar/lunar azimuth [deg]
-        PARM2 - solar/lunar zenith [deg]
-        PARM3 - not used
-        PARM4 - not used
-        TIME - not used
-        PSIPO - not used
-    """
-
-    PARM3 : float = 0.0
-    """
-    Not used for IPARM = 12
-    """
-
-    PARM4 : float = 0.0
-    """
-    Not used for IPARM = 12
-    """
-
-    TIME : float = 0.0
-    """
-    Not used for IPARM = 12
-    """
-
-    PSIPO : float = 0.0
-    """
-    Not used for IPARM = 12
-    """
-
-    FWHM : float = 2 * DV
-    """
-    Full-width-half-maximum for output smoothing kernel (scanning function)
-    MODTRAN manual recommends DV = FWHM / 2.
-    Usually the user will want to specify DV, so this satisfies that recommendation.
-    """
-
-    YFLAG : str = 'R'
-    """
-    Radiance output in PLTOUT
-    """
-
-    XFLAG : str = 'M'
-    """
-    Micron units used in PLTOUT
-    """
+            'runtime'       - wall-clock time of the run [s]
+            'stdout'        - last lines of MODTRAN's screen output
+            'stderr'        - last lines of MODTRAN's error output
+    """
+
+    # Validate and normalize the inputs, then build the tape5 file
+    params = Parameters(
+        MODTRN=MODTRN,
+        SPEED=SPEED,
+        MODEL=MODEL,
+        TPTEMP=TPTEMP,
+        SURREF=SURREF,
+        DIS=DIS,
+        DISAZM=DISAZM,
+        NSTR=NSTR,
+        CO2MX=CO2MX,
+        H2OSTR=H2OSTR,
+        O3STR=O3STR,
+        IHAZE=IHAZE,
+        CNOVAM=CNOVAM,
+        ISEASN=ISEASN,
+        IVULCN=IVULCN,
+        ICSTL=ICSTL,
+        IVSA=IVSA,
+        VIS=VIS,
+        WSS=WSS,
+        WHH=WHH,
+        RAINRT=RAINRT,
+        GNDALT=GNDALT,
+        H1=H1,
+        H2=H2,
+        ANGLE=ANGLE,
+        IPH=IPH,
+        IDAY=IDAY,
+        ISOURC=ISOURC,
+        PARM1=PARM1,
+        PARM2=PARM2,
+        ANGLEM=ANGLEM,
+        G=G,
+        V1=V1,
+        V2=V2,
+        DV=DV
+    )
+
+    return execute(username, password, params, hostname, quiet=quiet, progress=progress, store=store)
+
+
+def execute(username: str,
+            password: str,
+            params: Parameters,
+            hostname: str = 'grissom.cis.rit.edu',
+            workspace: str = 'modtran-temp',
+            quiet: bool = False,
+            progress = None,
+            store = None,
+    ) -> dict:
+    """Runs MODTRAN on a pre-validated set of parameters.
 
-    DLIMIT : str = ''
-    """
-    Not needed - used to separate output from multiple MODTRAN runs
-    """
+    username : str
+        Your CIS username
 
-    FLAGS : str = 'MRAA   '
-    """
-    String of characters indicating:
-        1 - ' ' defaults to 'W'
-            'W' spectral units in wavenumbers
-            'M' spectral units in microns
-            'N' spectral units in nanometers
-        2 - ' ' defaults to 'T'
-            'T' tri
-            'R' rect
-            'G' gauss
-            'S' sinc
-            'C' sinc2
-            'H' Hamming
-            'U' user-supplied
-        3 - ' ' defaults to 'A'
-            'A' FWHM is absolute
-            'R' FWHM is percent relative
-        4 - ' ' degrade only total radiance and transmittance
-            'A' degrade all radiance and transmittance components
-        5 - ' ' do not save current results
-            'S' save non-degraded results for degrading later
-        6 - ' ' do not use saved results
-            'R' use saved results for degrading with the current slit function
-        7 - ' ' do not write spectral flux table
-            'T' write a specflux file limited to 80 characters per line
-            'F' write a specflux file with all flux values on a single line
-    """
+    password : str
+        Your CIS password
 
-    MLFLX : int = 0
-    """
-    Number of atmospheric levels for which specflux is output.  Blank or 0 indicates
-    that all atmospheric levels will be output
-    """
+    params : modtran.Parameters
+        Input parameters (type 'help(modtran.Parameters)' for details)
 
-    IRPT : int = 0
-    """
-    Number of repeated runs
-    """
+    hostname : str
+        Name of CIS host
+        Default setting is grissom.cis.rit.edu
 
-    # Construct array of all inputs, including fixed MODTRAN inputs
-    card1 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [MODTRN,     'MODTRN',    str,      1,       MODTRN in ['T', 'M', 'C', 'K']],
-        [SPEED,      'SPEED',     str,      1,       SPEED in ['S', 'M']],
-        [MODEL,      'MODEL',     int,      3,       MODEL in [1, 2, 3, 4, 5, 6]],
-        [ITYPE,      'ITYPE',     int,      5,       ITYPE in [1, 2, 3]],
-        [IEMSCT,     'IEMSCT',    int,      5,       IEMSCT in [0, 1, 2, 3]],
-        [IMULT,      'IMULT',     int,      5,       IMULT in [0, 1, -1]],
-        [M1,         'M1',        int,      5,       M1 in [0, 1, 2, 3, 4, 5, 6]],
-        [M2,         'M2',        int,      5,       M2 in [0, 1, 2, 3, 4, 5, 6]],
-        [M3,         'M3',        int,      5,       M3 in [0, 1, 2, 3, 4, 5, 6]],
-        [M4,         'M4',        int,      5,       M4 in [0, 1, 2, 3, 4, 5, 6]],
-        [M5,         'M5',        int,      5,       M5 in [0, 1, 2, 3, 4, 5, 6]],
-        [M6,         'M6',        int,      5,       M6 in [0, 1, 2, 3, 4, 5, 6]],
-        [MDEF,       'MDEF',      int,      5,       MDEF in [1, 2]],
-        [IM,         'IM',        int,      5,       IM in [0, 1]],
-        [NOPRNT,     'NOPRNT',    int,      5,       NOPRNT in [0, 1, -1, -2]],
-        [TPTEMP,     'TPTEMP',    float,    (8, 3),  True],
-        [' ',        'space',     str,      1,       True],
-        [SURREF,     'SURREF',    float,    (6, 4),  SURREF >= 0 and SURREF <= 1]
-    ], dtype=object)
-
-    card1a = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [DIS,        'DIS',       str,      1,       DIS in ['T', 'F', 'S']],
-        [DISAZM,     'DISAZM',    str,      1,       DISAZM in ['T', 'F']],
-        [NSTR,       'NSTR',      int,      3,       NSTR in [2, 4, 8, 16]],
-        [LSUN,       'LSUN',      str,      1,       LSUN in ['T', 'F']],
-        [ISUN,       'ISUN',      int,      4,       ISUN == 10],
-        [CO2MX,      'CO2MX',     float,    (10, 5), True],
-        [H2OSTR,     'H2OSTR',    str,      10,      True],  # TODO: add condition for H2OSTR
-        [O3STR,      'O3STR',     str,      10,      True],  # TODO: add condition for O3STR
-        [LSUNFL,     'LSUNFL',    str,      2,       LSUNFL in ['T', 'F', '1', '2', '3', '4']],
-        [LBMNAM,     'LBMNAM',    str,      2,       LBMNAM in ['T', 'F']],
-        [LFLTNM,     'LFLTNM',    str,      2,       LFLTNM in ['T', 'F']],
-        [H2OAER,     'H2OAER',    str,      2,       H2OAER in ['T', 'F']],
-        ['  ',       '2space',    str,      2,       True],
-        [LDATDR,     'LDATDR',    str,      5,       LDATDR in ['T', '']],  # 'F' causes an error apparently...
-        [SOLCON,     'SOLCON',    int,      5,       True]
-    ], dtype=object)
-
-    card2 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [APLUS,      'APLUS',     str,      2,       APLUS in ['', ' ', 'A+']],
-        [IHAZE,      'IHAZE',     int,      3,       IHAZE in [-1, 0, 1, 2, 3, 4, 5, 6, 8, 9, 10]],
-        [CNOVAM,     'CNOVAM',    str,      1,       CNOVAM in ['', 'N']],
-        [ISEASN,     'ISEASN',    int,      4,       ISEASN in [0, 1, 2]],
-        [ARUSS,      'ARUSS',     str,      3,       ARUSS in ['', 'USS']],
-        [IVULCN,     'IVULCN',    int,      2,       IVULCN in [0, 1, 2, 3, 4, 5, 6, 7, 8]],
-        [ICSTL,      'ICSTL',     int,      5,       ICSTL in [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]],
-        [ICLD,       'ICLD',      int,      5,       ICLD in [0]], # TODO: clouds are disabled for now
-        [IVSA,       'IVSA',      int,      5,       IVSA in [0, 1]],
-        [VIS,        'VIS',       float,    (10, 5), True],
-        [WSS,        'WSS',       float,    (10, 5), True],
-        [WHH,        'WHH',       float,    (10, 5), True],
-        [RAINRT,     'RAINRT',    float,    (10, 5), True],
-        [GNDALT,     'GNDALT',    float,    (10, 5), True]
-    ], dtype=object)
-
-    card3 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [H1,         'H1',        float,    (10, 5), True],
-        [H2,         'H2',        float,    (10, 5), True],
-        [ANGLE,      'ANGLE',     float,    (10, 5), True],
-        [RANGE,      'RANGE',     float,    (10, 5), True],
-        [BETA,       'BETA',      float,    (10, 5), BETA >= 0 and BETA <= 180],
-        [RO,         'RO',        str,      10,      True],
-        [LENN,       'LENN',      int,      5,       LENN in [0, 1]],
-        ['     ',    'space',     str,      5,       True],
-        [PHI,        'PHI',       float,    (10, 5), PHI >=0 and PHI <= 180]
-    ], dtype=object)
-
-    card3a1 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [IPARM,       'IPARM',    int,      5,       IPARM in [12]],
-        [IPH,         'IPH',      int,      5,       IPH in [0, 2]],
-        [IDAY,        'IDAY',     int,      5,       IDAY in range(1, 366)],
-        [ISOURC,     'ISOURC',  int,      5,       ISOURC in [0, 1]],
-    ], dtype=object)
-
-    card3a2 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [PARM1,       'PARM1',    float,    (10, 3), PARM1 >= 0 and PARM1 <= 360],
-        [PARM2,       'PARM2',    float,    (10, 3), PARM2 >= 0 and PARM2 <= 180],
-        [PARM3,       'PARM3',    float,    (10, 3), True],
-        [PARM4,       'PARM4',    float,    (10, 3), True],
-        [TIME,        'TIME',     float,    (10, 3), True],
-        [PSIPO,       'PSIPO',    float,    (10, 3), True],
-        [ANGLEM,      'ANGLEM',   float,    (10, 3), ANGLEM >= 0 and ANGLEM <= 180],
-        [G,           'G',        float,    (10, 3), G >= 0 and G <= 1]
-    ], dtype=object)
-
-    card4 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [V1,          'V1',       float,    (10, 3), True], # TODO: find MODTRAN's min and max wavelengths to add here
-        [V2,          'V2',       float,    (10, 3), True],
-        [DV,          'DV',       float,    (10, 3), True],
-        [FWHM,        'FWHM',     float,    (10, 3), True],
-        [YFLAG,       'YFLAG',    str,      1,       YFLAG in ['T', 'R']],
-        [XFLAG,       'XFLAG',    str,      1,       XFLAG in ['W', 'M', 'N']],
-        [DLIMIT,      'DLIMIT',   str,      8,       True],
-        [FLAGS,       'FLAGS',    str,      7,       True], # TODO: add in specific conditions for each flag index
-        [MLFLX,       'MLFLX',    int,      3,       True]
-    ], dtype=object)
-
-    card5 = np.array([
-        #VARIABLE      NAME       TYPE      SIZE      CONDITION
-        [IRPT,        'IRPT',     int,      5,       IRPT in [0, 1, -1, 3, -3, 4, -4]]
-    ], dtype=object)
-
-
-    def inputcheck(VARIABLE, name, var_type, condition):
-        if type(VARIABLE) != var_type:
-            raise TypeError(name + " = " + str(VARIABLE) + " must be of type " + str(var_type))
-        if condition == False:
-            raise ValueError("Invalid value entered for variable " + name + ": " +\
-                             str(VARIABLE) + ".  Type 'help(modtran.run)' for valid entries.")
-
-    def add_to_tape5(card):
-        card_string = ''
-        for i in range(card.shape[0]):
-            VARIABLE = card[i, 0]
-            name = card[i, 1]
-            var_type = card[i, 2]
-            size = card[i, 3]
-            condition = card[i, 4]
-            inputcheck(VARIABLE, name, var_type, condition)
-            if var_type == str:
-                card_string += A(VARIABLE, size)
-            elif var_type == int:
-                card_string += I(VARIABLE, size)
-            elif var_type == float:
-                card_string += F(VARIABLE, size[0], size[1])
-            else:
-                raise ValueError("Unexpected type for variable " + name)
-        return card_string
-
-    # Build Tape 5 file
-    tape5 = ''
-    for card in [card1, card1a, card2, card3, card3a1, card3a2, card4, card5]:
-        tape5 += add_to_tape5(card)
-        tape5 += "\n"
-    output = {}
-    output['tape5'] = tape5
-
-    ####################################################################################################################
-    """
-                                         RUN MODTRAN ON LINUX SERVER
-    """
-    ####################################################################################################################
-
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy()) # this will automatically add the keys
-    ssh.connect(hostname, username=username, password=password)
-    sftp = ssh.open_sftp()
-
-    # Create a temporary directory called 'modtran-temp' and put the tape5 file in there
-    stdin, stdout, stderr = ssh.exec_command('rm -rf modtran-temp')  # in case the user cntrl-c'd out of last run
-    time.sleep(1)
-    sftp.mkdir('modtran-temp')
-    sftp.chdir('modtran-temp')
-    remote_temp_folder = sftp.getcwd()
-    local_folder = os.getcwd()
-    stdin, stdout, stderr = ssh.exec_command('cd ' + remote_temp_folder + ';'
-                                             'ln -s /dirs/pkg/Mod4v3r1/DATA DATA')
-    tape5_file = sftp.open('tape5', 'w+')
-    tape5_file.write(tape5)
-    tape5_file.close()
-
-    print('RUNNING MODTRAN...')
-    if MODTRN in ['C', 'K']:
-        print('    NOTE: CORRELATED K OPTION ENABLED - THIS COULD TAKE A WHILE...')
-    stdin, stdout, stderr = ssh.exec_command('cd ' + remote_temp_folder + ';'
-                                             '/dirs/pkg/Mod4v3r1/Mod4v3r1.exe;',
-                                             get_pty=True)
-    for line in iter(stdout.readline, ""):
-        print(line, end="")
-
-    print('DOWNLOADING OUTPUT FROM SERVER...')
-    done = False
-    while not done:
-        try:
-            sftp.get(remotepath=remote_temp_folder + '/tape7.scn',
-                     localpath=local_folder + '/tape7.scn')
-            sftp.get(remotepath=remote_temp_folder + '/tape7.scn',
-                     localpath=local_folder + '/tape7.scn')
-            done=True
-        except:
-            time.sleep(1)
-
-    # delete temporary directory
-    stdin, stdout, stderr = ssh.exec_command('rm -rf modtran-temp')
-    sftp.close()
-    ssh.close()
-
-    with open('tape7.scn') as file:
-        tape7scn = file.readlines()
-    output['tape7.scn'] = ''.join(tape7scn)
-    os.remove('tape7.scn')
-
-    num_lines = len(tape7scn)
-    num_header_lines = 11
-    num_footer_lines = 1
-    num_data_lines = num_lines - num_header_lines - num_footer_lines
-    num_columns = 13
-
-    tape7scn_array = np.zeros((num_data_lines, num_columns), dtype='<U16')
-    for i in range(num_data_lines):
-        row = num_header_lines + i
-        tape7scn_array[i, 0] = tape7scn[row][  4: 12]  # WAVELEN_MCRN
-        tape7scn_array[i, 1] = tape7scn[row][ 13: 19]  # TRANS
-        tape7scn_array[i, 2] = tape7scn[row][ 20: 30]  # PTH_THRML
-        tape7scn_array[i, 3] = tape7scn[row][ 31: 41]  # THRML_SCT
-        tape7scn_array[i, 4] = tape7scn[row][ 42: 52]  # SURF_EMIS
-        tape7scn_array[i, 5] = tape7scn[row][ 53: 63]  # SOL_SCAT
-        tape7scn_array[i, 6] = tape7scn[row][ 64: 74]  # SING_SCAT
-        tape7scn_array[i, 7] = tape7scn[row][ 75: 85]  # GRND_RFLT
-        tape7scn_array[i, 8] = tape7scn[row][ 86: 96]  # DRCT_RFLT
-        tape7scn_array[i, 9] = tape7scn[row][ 97:107]  # TOTAL_RAD
-        tape7scn_array[i,10] = tape7scn[row][108:116]  # REF_SOL
-        tape7scn_array[i,11] = tape7scn[row][117:125]  # SOLaOBS
-        tape7scn_array[i,12] = tape7scn[row][129:134]  # DEPTH
-
-    data_values = np.zeros_like(tape7scn_array, dtype=float)
-    for j in range(num_columns):
+    workspace : str
+        Name of the temporary directory created in your home directory on the server.
+        Concurrent runs must use different workspaces.  To run several cases over one
+        connection, use modtran.Session instead.  Not used when the case runs through a
+        broker.
+        Default setting is modtran-temp
+
+    quiet : bool
+        Only capture MODTRAN's screen output instead of echoing it
+        Default setting is False
+
+    progress : callable or None
+        Called with a modtran.Progress event as MODTRAN advances through the spectrum
+        Default setting is None
+
+    store : modtran.ResultStore or None
+        Store to serve the case from if present, and to add new output to
+        Default setting is None
+
+    If a connection broker is running (see 'modtran-broker --help'), the case is sent to it
+    so that its open connection is reused, otherwise (or if the broker doesn't respond or
+    sends a malformed reply) a new connection is opened.
+
+    Returns the same output dictionary as modtran.run
+    """
+    if store is not None:
+        output = store.get(params)
+        if output is not None:
+            return output
+    output = None
+    if broker.available():
         try:
-            data_values[:, j] = tape7scn_array[:, j].astype(float)
-        except:
-            data_values[:, j] = np.nan
-
-    output['WAVELEN MCRN'] = data_values[:, 0]
-    output['TRANS']        = data_values[:, 1]
-    output['PTH THRML']    = data_values[:, 2]
-    output['THRML SCT']    = data_values[:, 3]
-    output['SURF EMIS']    = data_values[:, 4]
-    output['SOL SCAT']     = data_values[:, 5]
-    output['SING SCAT']    = data_values[:, 6]
-    output['GRND RFLT']    = data_values[:, 7]
-    output['DRCT RFLT']    = data_values[:, 8]
-    output['TOTAL RAD']    = data_values[:, 9]
-    output['REF SOL']      = data_values[:,10]
-    output['SOL@OBS']      = data_values[:,11]
-    output['DEPTH']        = data_values[:,12]
-
+            output = broker.submit(username, password, params, hostname, quiet=quiet, progress=progress)
+        except OSError:
+            pass  # broker not listening, unresponsive or broken, connect directly
+    if output is None:
+        with Session(username, password, hostname, prefix=workspace) as session:
+            output = session.run(params, quiet=quiet, progress=progress)
+    if store is not None:
+        store.put(params, output, hostname)
     return output
@@ -0,0 +1,234 @@
+# Frozen, pre-validated set of MODTRAN inputs
+
+from dataclasses import dataclass, field, fields, replace
+import numpy as np
+from modtran.formats import F
+from modtran.tape5 import read_tape5, write_tape5
+
+
+FLOAT_FORMATS = {
+    #NAME        (SIZE, DECIMALS) as written to tape5
+    'TPTEMP':    (8, 3),
+    'SURREF':    (6, 4),
+    'CO2MX':     (10, 5),
+    'VIS':       (10, 5),
+    'WSS':       (10, 5),
+    'WHH':       (10, 5),
+    'RAINRT':    (10, 5),
+    'GNDALT':    (10, 5),
+    'H1':        (10, 5),
+    'H2':        (10, 5),
+    'ANGLE':     (10, 5),
+    'PARM1':     (10, 3),
+    'PARM2':     (10, 3),
+    'ANGLEM':    (10, 3),
+    'G':         (10, 3),
+    'V1':        (10, 3),
+    'V2':        (10, 3),
+    'DV':        (10, 3),
+}
+"""
+Width and number of decimal places of each float input on its tape5 card.  Floats are
+truncated to this precision, so inputs that produce the same tape5 compare equal.
+"""
+
+DEFAULT_VIS = {1: 23.0, 2: 5.0, 4: 23.0, 5: 5.0, 6: 50.0, 8: 0.2, 9: 0.5}
+"""
+Visibility [km] used by MODTRAN for each aerosol model IHAZE when VIS = 0.0
+"""
+
+
+@dataclass(frozen=True)
+class Parameters:
+    """Frozen set of MODTRAN inputs, validated once when constructed.
+
+    Takes the same keyword arguments (and defaults) as modtran.run, type 'help(modtran.run)'
+    for descriptions.  Raises TypeError or ValueError for invalid inputs.
+
+    Inputs are normalized so that cases which MODTRAN treats identically compare (and hash)
+    equal, which lets batches be deduplicated and Parameters be used as dictionary keys:
+        - integers (including numpy scalars) are accepted for float inputs
+        - floats are truncated to the number of decimal places written to tape5
+        - blank strings are equivalent to their defaults ('' and ' ' are the same,
+          MODTRN = '' is 'M', SPEED = '' is 'S', H2OSTR = '' is '0')
+        - numbers in H2OSTR and O3STR are written in their shortest form ('g1.50' is 'g1.5')
+        - VIS equal to the default visibility of IHAZE is set to 0.0, as is VIS for models
+          without aerosol extinction (IHAZE = -1 or 0)
+        - inputs ignored by MODTRAN for the chosen options are reset to their defaults
+          (G unless IPH = 0, ANGLEM unless ISOURC = 1, WSS unless IHAZE = 3 or 10,
+          WHH unless IHAZE = 3, ICSTL unless IHAZE = 3 or CNOVAM = 'N', DISAZM and NSTR
+          if DIS = 'F')
+
+    The tape5 file for the case is available as the 'tape5' attribute.
+    """
+
+    MODTRN : str   = 'M'    # MODTRAN band model
+    SPEED  : str   = 'S'    # S (slow, 33 abs coef), M (medium, 17 abs coef)
+    MODEL  : int   = 2      # 0-8 (the model atmosphere, 2 is MLS)
+    TPTEMP : float = 294.0  # number (target temperature [K])
+    SURREF : float = 0.75   # 0-1 (surface reflectance)
+    DIS    : str   = 'T'    # T, S, F (T=use DISORT, F=use Isaac 2-stream, S=scaled 2-stream)
+    DISAZM : str   = 'T'    # T, F (Azimuth dependence with DISORT)
+    NSTR   : int   = 8      # 2, 4, 8, 16 (Streams to use by DISORT)
+    CO2MX  : float = 365.0  # mixing ratio in ppmv
+    H2OSTR : str   = '0'    # water vapor column
+    O3STR  : str   = '0'    # ozone column
+    IHAZE  : int   = 1      # aerosol model
+    CNOVAM : str   = ''     # toggle Navy NOVAM model
+    ISEASN : int   = 0      # seasonal aerosol profile
+    IVULCN : int   = 0      # volcanic aerosol profile
+    ICSTL  : int   = 3      # air mass character used with NOVAM
+    IVSA   : int   = 0      # toggle Army VSA model
+    VIS    : float = 0.0    # visibility [km]
+    WSS    : float = 0.0    # wind speed [m/s]
+    WHH    : float = 0.0    # 24-hr wind speed [m/s]
+    RAINRT : float = 0.0    # rain rage [mm/hr]
+    GNDALT : float = 0.0    # ground altitude [km]
+    H1     : float = 100.0  # sensor altitude [km]
+    H2     : float = 0.0    # target altitude [km]
+    ANGLE  : float = 180.0  # zenith angle from sensor to target
+    IPH    : int   = 2      # phase function
+    IDAY   : int   = 93     # day of the year
+    ISOURC : int   = 0      # 0 for sun, 1 for moon
+    PARM1  : float = 0.0    # solar azimuth [deg E of N]
+    PARM2  : float = 0.0    # solar zenith [deg]
+    ANGLEM : float = 0.0    # phase of the moon (0 full, 180 none)
+    G      : float = 0.50   # Henyey-Greenstein asymmetry factor (used if IPH = 0)
+    V1     : float = 0.350  # wavelength [micron] minimum
+    V2     : float = 1.000  # wavelength [micron] maximum
+    DV     : float = 0.005  # wavelength [micron] increment
+
+    tape5  : str   = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        values = normalize(self.as_dict())
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, 'tape5', write_tape5(**values))
+
+    def as_dict(self) -> dict:
+        """Returns the inputs as a dictionary of keyword arguments for modtran.run"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def replace(self, **changes):
+        """Returns a copy of these Parameters with the given inputs changed"""
+        return replace(self, **changes)
+
+    @classmethod
+    def from_tape5(cls, text: str):
+        """Reads Parameters back from the text of a tape5 file (see modtran.tape5.read_tape5)"""
+        return cls(**read_tape5(text))
+
+
+def to_parameters(case) -> Parameters:
+    '''
+    Converts a case (Parameters or dictionary of modtran.run keyword arguments) to Parameters
+    '''
+    if isinstance(case, Parameters):
+        return case
+    if isinstance(case, dict):
+        return Parameters(**case)
+    raise TypeError("Case " + str(case) + " must be a modtran.Parameters or a dictionary")
+
+
+def input_value(params: Parameters, name: str) -> tuple:
+    '''
+    Returns (units, value) of a continuous input, where units is the prefix of a column
+    string ('g', 'a' or '' for H2OSTR and O3STR) and '' otherwise.  VIS = 0.0 is reported
+    as the default visibility of IHAZE.
+    '''
+    value = getattr(params, name)
+    if name == 'VIS' and value == 0.0 and params.IHAZE in DEFAULT_VIS:
+        return '', DEFAULT_VIS[params.IHAZE]
+    if isinstance(value, str):
+        units = value[0] if value[:1] in ['g', 'a'] else ''
+        try:
+            return units, float(value[len(units):])
+        except ValueError:
+            raise ValueError("Input " + name + " = " + value + " is not a number")
+    return '', float(value)
+
+
+def with_input(params: Parameters, name: str, value: float) -> Parameters:
+    '''
+    Returns a copy of params with the continuous input name set to value, keeping the units
+    of H2OSTR and O3STR and rounding to the number of decimal places written to tape5
+    '''
+    if isinstance(getattr(params, name), str):
+        units = input_value(params, name)[0]
+        return params.replace(**{name: units + np.format_float_positional(round(float(value), 6), trim='-')})
+    return params.replace(**{name: round(float(value), FLOAT_FORMATS[name][1])})
+
+
+def normalize(values: dict) -> dict:
+    '''
+    Returns a copy of a dictionary of MODTRAN inputs with equivalent inputs made identical.
+    Inputs of the wrong type are passed through unchanged, to be reported by write_tape5,
+    except inputs that are about to be reset, which are checked with write_tape5 here.
+    '''
+    values = dict(values)
+
+    # Numeric types
+    for name, value in values.items():
+        if isinstance(value, (bool, np.bool_)):
+            continue
+        if name in FLOAT_FORMATS and isinstance(value, (int, float, np.integer, np.floating)):
+            size, decimals = FLOAT_FORMATS[name]
+            value = float(value)
+            values[name] = float(F(value, size, decimals)) if np.isfinite(value) else value
+        elif isinstance(value, np.integer):
+            values[name] = int(value)
+
+    # Blank strings
+    for name, value in values.items():
+        if isinstance(value, str):
+            values[name] = value.strip()
+    if values['MODTRN'] == '':
+        values['MODTRN'] = 'M'
+    if values['SPEED'] == '':
+        values['SPEED'] = 'S'
+    for name in ['H2OSTR', 'O3STR']:
+        if isinstance(values[name], str):
+            values[name] = column_string(values[name])
+
+    # Visibility
+    if values['IHAZE'] in [-1, 0]:
+        values['VIS'] = 0.0
+    elif values['VIS'] == DEFAULT_VIS.get(values['IHAZE']):
+        values['VIS'] = 0.0
+
+    # Inputs that are ignored for the chosen options are still checked (as modtran.run does)
+    # before they are reset
+    resets = {}
+    if values['IPH'] != 0:
+        resets['G'] = 0.5
+    if values['ISOURC'] != 1:
+        resets['ANGLEM'] = 0.0
+    if values['IHAZE'] not in [3, 10]:
+        resets['WSS'] = 0.0
+    if values['IHAZE'] != 3:
+        resets['WHH'] = 0.0
+    if values['IHAZE'] != 3 and values['CNOVAM'] != 'N':
+        resets['ICSTL'] = 3
+    if values['DIS'] == 'F':
+        resets['DISAZM'] = 'T'
+        resets['NSTR'] = 8
+    if any(type(values[name]) != type(default) or values[name] != default for name, default in resets.items()):
+        write_tape5(**values)
+    values.update(resets)
+
+    return values
+
+
+def column_string(text: str) -> str:
+    '''
+    Normalizes a water vapor or ozone column string (H2OSTR or O3STR)
+    '''
+    if text == '':
+        return '0'
+    prefix = text[0] if text[0] in ['g', 'a'] else ''
+    try:
+        number = float(text[len(prefix):])
+    except ValueError:
+        return text
+    return prefix + np.format_float_positional(number, trim='-')
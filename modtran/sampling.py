@@ -0,0 +1,235 @@
+# Chooses MODTRAN cases for lookup tables by refining where interpolation is inaccurate
+
+import itertools
+import numpy as np
+from modtran.batch import run_batch
+from modtran.parameters import input_value, to_parameters, with_input
+
+
+def corners(cell: tuple) -> list:
+    '''
+    Returns the corner points of a cell (lower, upper)
+    '''
+    return list(itertools.product(*zip(*cell)))
+
+
+def center(cell: tuple) -> tuple:
+    '''
+    Returns the center point of a cell (lower, upper)
+    '''
+    return tuple((a + b) / 2 for a, b in zip(*cell))
+
+
+def split(cell: tuple, inputs: list = None) -> list:
+    '''
+    Bisects a cell (lower, upper) along the inputs with the given indices (every input if
+    None), returning its children
+    '''
+    lower, upper = cell
+    middle = center(cell)
+    if inputs is None:
+        inputs = range(len(lower))
+    halves = [((a, m), (m, b)) if i in inputs else ((a, b),) for i, (a, m, b) in enumerate(zip(lower, middle, upper))]
+    return [tuple(zip(*child)) for child in itertools.product(*halves)]
+
+
+def edges(cell: tuple) -> list:
+    '''
+    Returns (start, midpoint, end) of the edge along each input that starts at the lower
+    corner of a cell (lower, upper)
+    '''
+    lower, upper = cell
+    middle = center(cell)
+    return [(lower, lower[:i] + (middle[i],) + lower[i + 1:], lower[:i] + (upper[i],) + lower[i + 1:])
+            for i in range(len(lower))]
+
+
+def adaptive_sample(username: str,
+                    password: str,
+                    base,
+                    bounds: dict,
+                    tolerance: float = 0.01,
+                    columns: list = None,
+                    budget: int = 500,
+                    initial: int = 3,
+                    relative: bool = True,
+                    hostname = 'grissom.cis.rit.edu',
+                    workers: int = 1,
+    ) -> dict:
+    """Samples MODTRAN cases over a box of continuous inputs, refining only where needed.
+
+    The box is divided into cells whose corners are run.  The center of each cell is also
+    run and compared with the multilinear interpolation of the corners (their mean), and
+    the midpoint of one edge along each input with the mean of that edge's ends.  Cells
+    whose interpolation error exceeds tolerance are bisected along the inputs whose edge
+    error exceeds tolerance (along every input if only the center is off), largest error
+    first, until every cell is within tolerance or the run budget is spent.  Each round of
+    new cases is run as one deduplicated batch with modtran.run_batch.
+
+    Cells too small to refine further at the precision of tape5 (e.g. 0.001 for PARM2)
+    are reported as unresolved.
+
+
+    Required Arguments:
+
+    username : str
+        Your CIS username
+
+    password : str
+        Your CIS password
+
+    base : modtran.Parameters or dict
+        Case providing every input that is not sampled
+
+    bounds : dict
+        Range of each sampled input, e.g. {'H2OSTR': (0.5, 4.0), 'VIS': (5, 100), 'PARM2': (0, 70)}.
+        H2OSTR and O3STR values are numbers in the units of base (which must not be '0').
+    __________________________________________________________________________________________
+
+    Keyword Arguments:
+
+    tolerance : float
+        Largest acceptable interpolation error at a cell center
+        Default setting is 0.01
+
+    columns : list of str
+        tape7.scn columns the error is measured on
+        Default setting is ['TOTAL RAD']
+
+    budget : int
+        Maximum number of MODTRAN runs
+        Default setting is 500
+
+    initial : int
+        Number of points along each input in the starting grid (at least 2)
+        Default setting is 3
+
+    relative : bool
+        True - error is relative to the largest value of each column at the cell center
+        False - error is absolute
+        Default setting is True
+
+    hostname : str or list of str
+        Name of CIS host(s), see 'help(modtran.run_batch)'
+        Default setting is grissom.cis.rit.edu
+
+    workers : int
+        Number of cases run at the same time on each host
+        Default setting is 1
+    __________________________________________________________________________________________
+
+    Returns:
+
+    output : dict
+        Output dictionary with the following keys:
+            'inputs'        - names of the sampled inputs
+            'cases'         - list of modtran.Parameters that were run
+            'outputs'       - list of their output dictionaries
+            'points'        - array (cases, inputs) of the sampled input values
+            'cells'         - list of final cells (lower, upper, error)
+            'unresolved'    - list of cells (lower, upper, error) that could not be refined
+                              below tolerance at the precision of tape5
+            'converged'     - True if every cell is within tolerance
+    """
+    if columns is None:
+        columns = ['TOTAL RAD']
+    if initial < 2:
+        raise ValueError("Starting grid needs at least 2 points along each input")
+    base = to_parameters(base)
+    names = list(bounds)
+    for name in names:
+        if name in ['H2OSTR', 'O3STR'] and getattr(base, name) == '0':
+            raise ValueError("Set " + name + " in base to a number to sample it")
+    outputs = {}
+
+    def case(point):
+        params = base
+        for name, value in zip(names, point):
+            params = with_input(params, name, value)
+        return params
+
+    def needed(cells):
+        points = [point for cell in cells for point in corners(cell) + [center(cell)] +
+                  [midpoint for start, midpoint, end in edges(cell)]]
+        return {case(point) for point in points} - set(outputs)
+
+    def evaluate(cases):
+        cases = list(cases)
+        outputs.update(zip(cases, run_batch(username, password, cases, hostname, workers)))
+
+    def deviation(point, ends):
+        # Interpolation error at point of the mean of the outputs at ends, None if point is
+        # one of the ends at the precision of tape5
+        middle = case(point)
+        ends = [case(end) for end in ends]
+        if middle in ends:
+            return None
+        worst = 0.0
+        for column in columns:
+            actual = np.asarray(outputs[middle][column], dtype=float)
+            interpolated = np.mean([outputs[end][column] for end in ends], axis=0)
+            difference = np.max(np.abs(actual - interpolated))
+            if relative:
+                difference /= max(np.max(np.abs(actual)), np.finfo(float).tiny)
+            worst = max(worst, difference)
+        return worst
+
+    def refinable(cell, i):
+        # True if bisecting a cell along input i leaves edges whose midpoints can be run
+        return all(case(midpoint) not in [case(start), case(end)]
+                   for child in split(cell, [i]) for start, midpoint, end in [edges(child)[i]])
+
+    def assess(cell):
+        # Returns (cell, error, indices of the inputs to bisect along), where the inputs are
+        # [] if the cell is within tolerance and None if it can't be refined any further
+        along = [deviation(midpoint, [start, end]) for start, midpoint, end in edges(cell)]
+        middle = deviation(center(cell), corners(cell))
+        error = max([value for value in along + [middle] if value is not None], default=0.0)
+        if middle is not None and error <= tolerance:
+            return cell, error, []
+        driving = [i for i, value in enumerate(along) if value is not None and value > tolerance]
+        inputs = [i for i in driving or range(len(along)) if refinable(cell, i)]
+        if error > tolerance and inputs:
+            return cell, error, inputs
+        return cell, error, None
+
+    # Starting grid
+    axes = [np.linspace(lower, upper, initial) for lower, upper in bounds.values()]
+    cells = [(tuple(axis[i] for axis, i in zip(axes, index)), tuple(axis[i + 1] for axis, i in zip(axes, index)))
+             for index in itertools.product(range(initial - 1), repeat=len(names))]
+    first = needed(cells)
+    if len(first) > budget:
+        raise ValueError("Starting grid needs " + str(len(first)) + " runs, more than the budget of " + str(budget))
+    evaluate(first)
+    leaves = [assess(cell) for cell in cells]
+
+    # Refine the worst cells that fit in the remaining budget
+    converged = False
+    while True:
+        candidates = sorted([leaf for leaf in leaves if leaf[2]], key=lambda leaf: -leaf[1])
+        if not candidates:
+            converged = all(leaf[2] is not None for leaf in leaves)
+            break
+        chosen, new = [], set()
+        for leaf in candidates:
+            extra = needed(split(leaf[0], leaf[2])) - new
+            if len(outputs) + len(new) + len(extra) <= budget:
+                chosen.append(leaf)
+                new |= extra
+        if not chosen:
+            break
+        print('REFINING ' + str(len(chosen)) + ' CELLS WITH ' + str(len(new)) + ' NEW CASES...')
+        evaluate(new)
+        leaves = [leaf for leaf in leaves if leaf not in chosen]
+        leaves += [assess(child) for leaf in chosen for child in split(leaf[0], leaf[2])]
+
+    cases = list(outputs)
+    result = {}
+    result['inputs'] = names
+    result['cases'] = cases
+    result['outputs'] = [outputs[params] for params in cases]
+    result['points'] = np.array([[input_value(params, name)[1] for name in names] for params in cases])
+    result['cells'] = [(cell[0], cell[1], cell_error) for cell, cell_error, inputs in leaves]
+    result['unresolved'] = [(cell[0], cell[1], cell_error) for cell, cell_error, inputs in leaves if inputs is None]
+    result['converged'] = converged
+    return result
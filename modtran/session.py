@@ -0,0 +1,317 @@
+# Keeps an authenticated connection and a pool of ready workspaces on a CIS host
+
+import os
+import queue
+import re
+import select
+import shlex
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import paramiko
+from modtran.parameters import Parameters, to_parameters
+from modtran.tape7 import read_tape7
+
+
+MODTRAN_DIRECTORY = '/dirs/pkg/Mod4v3r1'
+"""
+Location of the MODTRAN executable and its DATA directory on the CIS servers
+"""
+
+BUFFER_LINES = 1000
+"""
+Number of lines of MODTRAN's stdout and stderr kept in the output dictionary
+"""
+
+PROGRESS_PATTERN = re.compile(r'^\s*FREQ(?:UENCY)?\s*=\s*([-+]?\d+\.?\d*(?:[eE][-+]?\d+)?)\s*(?:CM-1)?\s*$',
+                              re.IGNORECASE)
+"""
+Line of MODTRAN's screen output reporting the wavenumber [cm-1] of the spectral loop, e.g.
+' FREQ =    1000.00 CM-1'.  Other lines (card echoes, banners, counters) are never progress.
+"""
+
+Progress = namedtuple('Progress', ['fraction', 'wavenumber', 'line'])
+Progress.__doc__ = """Progress event passed to the progress callback of a run.
+
+    fraction : float
+        Fraction (0-1) of the spectral range completed
+    wavenumber : float
+        Wavenumber [cm-1] MODTRAN reported working on
+    line : str
+        Line of MODTRAN's screen output the event was parsed from
+"""
+
+
+def unique_prefix(prefix: str = 'modtran-temp') -> str:
+    '''
+    Returns a workspace prefix that is unique to this process (prefix-<local host>-<pid>), so
+    that processes on different machines sharing a home directory don't delete each other's
+    workspaces
+    '''
+    return prefix + '-' + socket.gethostname().split('.')[0] + '-' + str(os.getpid())
+
+
+def parse_progress(line: str, params: Parameters):
+    '''
+    Returns a Progress event if a line of MODTRAN's screen output is a frequency report (see
+    PROGRESS_PATTERN) inside the spectral range of params, otherwise None.  MODTRAN steps
+    from low to high wavenumber, i.e. from V2 down to V1 in microns.
+    '''
+    match = PROGRESS_PATTERN.match(line)
+    if match is None:
+        return None
+    low, high = sorted([1e4 / max(params.V1, 1e-6), 1e4 / max(params.V2, 1e-6)])
+    wavenumber = float(match.group(1))
+    if low <= wavenumber <= high and high > low:
+        return Progress((wavenumber - low) / (high - low), wavenumber, line)
+    return None
+
+
+class LineBuffer:
+    '''
+    Splits a byte stream into lines, keeping the last BUFFER_LINES of them and passing each
+    complete line to callback (if not None)
+    '''
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lines = deque(maxlen=BUFFER_LINES)
+        self._partial = ''
+
+    def feed(self, data: bytes):
+        lines = (self._partial + data.decode(errors='replace')).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._add(line.rstrip('\r'))
+
+    def _add(self, line):
+        self.lines.append(line)
+        if self.callback is not None:
+            self.callback(line)
+
+    def text(self) -> str:
+        if self._partial:
+            self._add(self._partial.rstrip('\r'))
+            self._partial = ''
+        return '\n'.join(self.lines)
+
+
+class Session:
+    """Authenticated connection to a CIS host with a pool of workspaces ready to run MODTRAN.
+
+    Each workspace is a directory in your home directory on the server with a link to
+    MODTRAN's DATA directory.  The workspaces are created once when the session opens and
+    deleted when it closes, so each run only uploads tape5, runs MODTRAN and reads
+    tape7.scn.  Use as a context manager, or call close() when done:
+
+        with modtran.Session(username, password) as session:
+            output = session.run(SURREF=0.1)
+
+
+    Required Arguments:
+
+    username : str
+        Your CIS username
+
+    password : str or None
+        Your CIS password, or None to log in with an SSH key or a running SSH agent
+
+    hostname : str
+        Name of CIS host
+        Default setting is grissom.cis.rit.edu
+
+    workspaces : int
+        Number of workspaces, i.e. the number of runs that may execute at the same time
+        from different threads
+        Default setting is 1
+
+    prefix : str
+        Name of the workspace directory (numbered prefix-0, prefix-1, ... for more than
+        one workspace).  Sessions open at the same time must use different prefixes,
+        since home directories are shared between hosts.
+        Default setting is modtran-temp
+
+    key_filename : str or None
+        Private key file to log in with (otherwise the SSH agent and the keys in ~/.ssh
+        are tried)
+        Default setting is None
+    """
+
+    def __init__(self,
+                 username: str,
+                 password: str,
+                 hostname: str = 'grissom.cis.rit.edu',
+                 workspaces: int = 1,
+                 prefix: str = 'modtran-temp',
+                 key_filename: str = None,
+        ):
+        if workspaces < 1:
+            raise ValueError("Number of workspaces must be at least 1")
+        if prefix in ['', '.', '..'] or '/' in prefix:
+            raise ValueError("Workspace prefix " + repr(prefix) + " must be a plain directory name")
+        self.hostname = hostname
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy()) # this will automatically add the keys
+        self._closed = False
+        self._executor = None
+        self._lock = threading.Lock()
+        try:
+            self.ssh.connect(hostname, username=username, password=password, key_filename=key_filename)
+            self._provision(workspaces, prefix)
+        except BaseException:
+            # Don't leak the connection or the workspaces if the login or workspace setup fails
+            self._closed = True
+            try:
+                if getattr(self, 'workspaces', None):
+                    self._exec('rm -rf ' + ' '.join(map(shlex.quote, self.workspaces)))
+            except Exception:
+                pass
+            finally:
+                self.ssh.close()
+            raise
+
+    def _provision(self, workspaces, prefix):
+        # Create every workspace (removing any left over from an interrupted run) in one command
+        sftp = self.ssh.open_sftp()
+        home = sftp.normalize('.')
+        sftp.close()
+        if workspaces == 1:
+            names = [prefix]
+        else:
+            names = [prefix + '-' + str(i) for i in range(workspaces)]
+        self.workspaces = [home + '/' + name for name in names]
+        self._exec(' && '.join('rm -rf ' + shlex.quote(path) + ' && mkdir ' + shlex.quote(path) + ' && '
+                               'ln -s ' + shlex.quote(MODTRAN_DIRECTORY + '/DATA') + ' ' + shlex.quote(path + '/DATA')
+                               for path in self.workspaces))
+
+        # Each workspace gets its own SFTP channel so that runs in different threads don't wait on each other
+        self._pool = queue.Queue()
+        for path in self.workspaces:
+            self._pool.put((path, self.ssh.open_sftp()))
+
+    def _exec(self, command):
+        stdin, stdout, stderr = self.ssh.exec_command(command)
+        if stdout.channel.recv_exit_status() != 0:
+            raise RuntimeError("Command failed on " + self.hostname + ": " + command + "\n" +
+                               stderr.read().decode())
+
+    def run(self, case=None, quiet: bool = False, progress=None, **kwargs) -> dict:
+        """Runs MODTRAN in the next free workspace.
+
+        case : modtran.Parameters or dict
+            Input parameters.  Alternatively, pass the keyword arguments of modtran.run
+            directly (type 'help(modtran.run)' for descriptions).
+
+        quiet : bool
+            False - echo MODTRAN's screen output to the console (using a terminal on the server)
+            True - only capture MODTRAN's screen output
+            Default setting is False
+
+        progress : callable or None
+            Called with a modtran.Progress event each time MODTRAN reports the wavenumber
+            it is working on
+            Default setting is None
+
+        Returns the same output dictionary as modtran.run
+        """
+        if self._closed:
+            raise RuntimeError("Session to " + self.hostname + " is closed")
+        params = to_parameters(case) if case is not None else Parameters(**kwargs)
+        output = {}
+        output['tape5'] = params.tape5
+        start_time = time.time()
+
+        path, sftp = self._pool.get()
+        try:
+            with sftp.open(path + '/tape5', 'w') as file:
+                file.write(params.tape5)
+
+            if not quiet:
+                print('RUNNING MODTRAN...')
+                if params.MODTRN in ['C', 'K']:
+                    print('    NOTE: CORRELATED K OPTION ENABLED - THIS COULD TAKE A WHILE...')
+            stdout, stderr = self._exec_modtran(path, params, quiet, progress)
+            output['stdout'] = stdout
+            output['stderr'] = stderr
+
+            if not quiet:
+                print('DOWNLOADING OUTPUT FROM SERVER...')
+            try:
+                with sftp.open(path + '/tape7.scn') as file:
+                    output['tape7.scn'] = file.read().decode()
+            except IOError:
+                raise RuntimeError("MODTRAN did not write tape7.scn on " + self.hostname + ":\n" +
+                                   stdout[-2000:] + stderr[-2000:])
+        finally:
+            self._pool.put((path, sftp))
+
+        output['runtime'] = time.time() - start_time
+        output.update(read_tape7(output['tape7.scn']))
+        return output
+
+    def _exec_modtran(self, path, params, quiet, progress):
+        # Reads stdout and stderr as they arrive, keeping the last BUFFER_LINES lines of each
+        channel = self.ssh.get_transport().open_session()
+        if not quiet:
+            channel.get_pty()
+        channel.exec_command('cd ' + shlex.quote(path) + ' && rm -f tape7.scn && ' +
+                             shlex.quote(MODTRAN_DIRECTORY + '/Mod4v3r1.exe'))
+
+        def on_stdout(line):
+            if not quiet:
+                print(line)
+            if progress is not None:
+                event = parse_progress(line, params)
+                if event is not None:
+                    progress(event)
+
+        stdout = LineBuffer(on_stdout)
+        stderr = LineBuffer(None if quiet else print)
+        while True:
+            select.select([channel], [], [], 0.1)
+            while channel.recv_ready():
+                stdout.feed(channel.recv(32768))
+            while channel.recv_stderr_ready():
+                stderr.feed(channel.recv_stderr(32768))
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+        channel.close()
+        return stdout.text(), stderr.text()
+
+    def submit(self, case=None, quiet: bool = True, progress=None, **kwargs) -> Future:
+        """Starts a run in the background and returns immediately.
+
+        Takes the same arguments as Session.run, except that quiet defaults to True.
+        Returns a concurrent.futures.Future whose result() is the output dictionary.
+        Up to one run per workspace executes at a time.
+        """
+        if self._closed:
+            raise RuntimeError("Session to " + self.hostname + " is closed")
+        params = to_parameters(case) if case is not None else Parameters(**kwargs)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self.workspaces))
+        return self._executor.submit(self.run, params, quiet, progress)
+
+    def close(self):
+        """Deletes the workspaces and closes the connection"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        try:
+            while not self._pool.empty():
+                path, sftp = self._pool.get()
+                sftp.close()
+            self._exec('rm -rf ' + ' '.join(map(shlex.quote, self.workspaces)))
+        finally:
+            self.ssh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,133 @@
+# Solar geometry for MODTRAN cases from observation times and locations
+
+import numpy as np
+from modtran.batch import run_batch
+from modtran.parameters import to_parameters
+
+
+def solar_position(latitude, longitude, times) -> tuple:
+    '''
+    Returns (zenith [deg], azimuth [deg EAST of NORTH], day of year) of the sun for arrays of
+    latitude [deg N], longitude [deg E] and UTC times (numpy datetime64 or ISO 8601 strings),
+    broadcast against each other.  Uses NOAA's fractional-year approximation (~0.1 deg).
+    '''
+    times = np.asarray(times, dtype='datetime64[s]')
+    latitude, longitude, times = np.broadcast_arrays(np.asarray(latitude, dtype=float),
+                                                     np.asarray(longitude, dtype=float), times)
+    days = times.astype('datetime64[D]')
+    day = (days - times.astype('datetime64[Y]').astype('datetime64[D]')).astype(int) + 1
+    hours = (times - days).astype('timedelta64[s]').astype(float) / 3600
+
+    # Fractional year [rad], equation of time [min] and declination [rad]
+    g = 2 * np.pi / 365 * (day - 1 + (hours - 12) / 24)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(g) - 0.032077 * np.sin(g)
+                                 - 0.014615 * np.cos(2 * g) - 0.040849 * np.sin(2 * g))
+    declination = (0.006918 - 0.399912 * np.cos(g) + 0.070257 * np.sin(g) - 0.006758 * np.cos(2 * g)
+                   + 0.000907 * np.sin(2 * g) - 0.002697 * np.cos(3 * g) + 0.00148 * np.sin(3 * g))
+
+    # Hour angle [rad] from true solar time
+    solar_minutes = hours * 60 + equation_of_time + 4 * longitude
+    hour_angle = np.radians(solar_minutes / 4 - 180)
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+    azimuth = np.degrees(np.arctan2(np.sin(hour_angle),
+                                    np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))) + 180
+    return zenith, np.mod(azimuth, 360), day
+
+
+def snap(values, tolerance):
+    '''
+    Rounds values to the nearest multiple of tolerance (no rounding if tolerance is None)
+    '''
+    if tolerance is None or tolerance == 0:
+        return values
+    return np.round(np.asarray(values) / tolerance) * tolerance
+
+
+def solar_cases(base, latitude, longitude, times, angle_tolerance=None, day_tolerance=None,
+                max_zenith: float = 90.0) -> tuple:
+    """Builds the distinct MODTRAN cases needed for a series of observation times and places.
+
+    Each observation gets a copy of base with PARM1 (solar azimuth), PARM2 (solar zenith)
+    and IDAY from solar_position.  Angles are snapped to multiples of angle_tolerance [deg]
+    and days to multiples of day_tolerance, so that observations with nearly the same sun
+    share one case.  Observations with the sun lower than max_zenith get no case.
+
+    base : modtran.Parameters or dict
+        Case providing every other input
+
+    latitude, longitude, times : arrays
+        Location [deg N, deg E] and UTC time of each observation (see solar_position)
+
+    angle_tolerance : float or (float, float) or None
+        Snapping step [deg] for the angles, or separate (azimuth, zenith) steps
+        Default setting is None (no snapping)
+
+    day_tolerance : int or None
+        Snapping step [days] for IDAY
+        Default setting is None (no snapping)
+
+    max_zenith : float
+        Largest solar zenith [deg] that gets a case
+        Default setting is 90.0
+
+    Returns (cases, index) where cases is the list of distinct modtran.Parameters and index
+    is an integer array giving each observation's position in cases (-1 for no case)
+    """
+    base = to_parameters(base)
+    zenith, azimuth, day = solar_position(latitude, longitude, times)
+    shape = zenith.shape
+    zenith, azimuth, day = zenith.ravel(), azimuth.ravel(), day.ravel()
+
+    azimuth_tolerance, zenith_tolerance = np.broadcast_to(np.array(angle_tolerance, dtype=object), 2)
+    zenith = np.clip(snap(zenith, zenith_tolerance), 0, 180)
+    azimuth = np.mod(snap(azimuth, azimuth_tolerance), 360)
+    if day_tolerance:
+        day = np.clip(np.round((day - 1) / day_tolerance) * day_tolerance + 1, 1, 365)
+    day = np.minimum(day, 365).astype(int)  # MODTRAN accepts days 1-365
+    daylight = zenith < max_zenith
+
+    # Only build Parameters for the distinct (azimuth, zenith, day) combinations
+    keys = np.stack([np.round(azimuth, 3), np.round(zenith, 3), day], axis=1)
+    unique, inverse = np.unique(keys[daylight], axis=0, return_inverse=True)
+    cases = []
+    positions = {}
+    case_of_key = np.empty(len(unique), dtype=int)
+    for k, (a, z, d) in enumerate(unique):
+        case = base.replace(PARM1=float(a), PARM2=float(z), IDAY=int(d))
+        case_of_key[k] = positions.setdefault(case, len(cases))
+        if case_of_key[k] == len(cases):
+            cases.append(case)
+
+    index = np.full(len(zenith), -1, dtype=int)
+    index[daylight] = case_of_key[np.ravel(inverse)]
+    return cases, index.reshape(shape)
+
+
+def run_solar(username: str,
+              password: str,
+              base,
+              latitude,
+              longitude,
+              times,
+              angle_tolerance = None,
+              day_tolerance = None,
+              max_zenith: float = 90.0,
+              **kwargs
+    ) -> list:
+    """Runs MODTRAN for a series of observation times and places, one run per distinct sun.
+
+    Takes username, password, base, latitude, longitude, times, angle_tolerance,
+    day_tolerance and max_zenith as described in 'help(modtran.solar_cases)'.  Remaining
+    keyword arguments (hostname, workers, store, ...) are passed to modtran.run_batch.
+
+    Returns a list with the output dictionary of each observation (flattened in the order of
+    the broadcast inputs), or None for observations with the sun below max_zenith.
+    Observations sharing a case share the same output dictionary.
+    """
+    cases, index = solar_cases(base, latitude, longitude, times, angle_tolerance, day_tolerance, max_zenith)
+    print(str(index.size) + ' OBSERVATIONS NEED ' + str(len(cases)) + ' CASES')
+    outputs = run_batch(username, password, cases, **kwargs) if cases else []
+    return [outputs[i] if i >= 0 else None for i in index.ravel()]
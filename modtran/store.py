@@ -0,0 +1,166 @@
+# Local database of MODTRAN results, used to skip runs that were already done
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from modtran.parameters import Parameters, to_parameters
+from modtran.tape7 import read_tape7
+
+
+DEFAULT_STORE = os.path.join(os.path.expanduser('~'), '.modtran', 'results.sqlite')
+"""
+Default location of the result store
+"""
+
+ARCHIVE_PAIRS = [
+    #TAPE5 FILE NAME      TAPE7.SCN FILE NAME
+    ('tape5',             'tape7.scn'),
+    ('.tape5',            '.tape7.scn'),   # <name>.tape5 and <name>.tape7.scn
+    ('.tp5',              '.7sc'),         # MODTRAN root-name convention
+]
+"""
+File names recognized as tape5/tape7.scn pairs when importing archives
+"""
+
+
+def key(params: Parameters) -> str:
+    '''
+    Returns the key of a case in the store (a hash of its normalized tape5)
+    '''
+    return hashlib.sha1(params.tape5.encode()).hexdigest()
+
+
+class ResultStore:
+    """Indexed local store of MODTRAN results, keyed by their (normalized) inputs.
+
+    path : str
+        SQLite database file, created if it does not exist
+        Default setting is DEFAULT_STORE (~/.modtran/results.sqlite)
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                     'key TEXT PRIMARY KEY, tape5 TEXT, tape7 TEXT, source TEXT, added REAL)')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def __contains__(self, case):
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM results WHERE key = ?',
+                                            (key(to_parameters(case)),)).fetchone() is not None
+
+    def get(self, case):
+        '''
+        Returns the output dictionary of a case (Parameters or dictionary of inputs) in the
+        same form as modtran.run (without 'runtime', 'stdout' and 'stderr'), or None
+        '''
+        params = to_parameters(case)
+        with self._lock:
+            row = self._connection.execute('SELECT tape7 FROM results WHERE key = ?', (key(params),)).fetchone()
+        if row is None:
+            return None
+        output = {}
+        output['tape5'] = params.tape5
+        output['tape7.scn'] = row[0]
+        output.update(read_tape7(row[0]))
+        return output
+
+    def put(self, case, output: dict, source: str = ''):
+        '''
+        Adds the output dictionary of a case, replacing any earlier result
+        '''
+        self.put_many([(to_parameters(case), output['tape7.scn'], source)])
+
+    def put_many(self, records: list):
+        '''
+        Adds a list of (Parameters, tape7.scn text, source) records in one transaction
+        '''
+        rows = [(key(params), params.tape5, tape7, source, time.time()) for params, tape7, source in records]
+        with self._lock, self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', rows)
+
+    def add(self, output: dict, source: str = ''):
+        '''
+        Adds an output dictionary from modtran.run, reading its inputs back from output['tape5']
+        '''
+        self.put(Parameters.from_tape5(output['tape5']), output, source)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def find_pairs(directory: str) -> list:
+    '''
+    Returns (tape5 path, tape7.scn path) for every archived pair under directory (see ARCHIVE_PAIRS)
+    '''
+    pairs = []
+    for root, dirs, files in os.walk(directory):
+        names = set(files)
+        for name in files:
+            for tape5_name, tape7_name in ARCHIVE_PAIRS:
+                if name == tape5_name or (tape5_name.startswith('.') and name.endswith(tape5_name)):
+                    partner = name[:len(name) - len(tape5_name)] + tape7_name
+                    if partner in names:
+                        pairs.append((os.path.join(root, name), os.path.join(root, partner)))
+    return sorted(pairs)
+
+
+def import_archive(directory: str, store: ResultStore = None, workers: int = 8) -> dict:
+    """Imports archived tape5/tape7.scn pairs from a directory tree into a result store.
+
+    Pairs are found with find_pairs, read and parsed in parallel, and added in one
+    transaction.  Pairs whose tape5 uses inputs that this API fixes (or cannot be read), or
+    whose tape7.scn has no data, are skipped.
+
+    directory : str
+        Directory searched recursively
+
+    store : modtran.ResultStore
+        Store to import into
+        Default setting is ResultStore() (~/.modtran/results.sqlite)
+
+    workers : int
+        Number of files read at the same time
+        Default setting is 8
+
+    Returns a dictionary with 'imported' (number of pairs added) and 'skipped' (list of
+    (tape5 path, reason))
+    """
+    if store is None:
+        store = ResultStore()
+
+    def load(pair):
+        tape5_path, tape7_path = pair
+        try:
+            with open(tape5_path) as file:
+                params = Parameters.from_tape5(file.read())
+            with open(tape7_path) as file:
+                tape7 = file.read()
+            if len(read_tape7(tape7)['WAVELEN MCRN']) == 0:
+                raise ValueError("tape7.scn has no data")
+        except (OSError, TypeError, ValueError) as error:
+            return None, (tape5_path, str(error))
+        return (params, tape7, os.path.abspath(tape7_path)), None
+
+    pairs = find_pairs(directory)
+    print('IMPORTING ' + str(len(pairs)) + ' TAPE5/TAPE7.SCN PAIRS...')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(load, pairs))
+    records = [record for record, skipped in results if record is not None]
+    skipped = [skipped for record, skipped in results if skipped is not None]
+    store.put_many(records)
+    if skipped:
+        print('    SKIPPED ' + str(len(skipped)) + ' PAIRS')
+    return {'imported': len(records), 'skipped': skipped}
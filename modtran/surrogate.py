@@ -0,0 +1,275 @@
+# Fast approximate MODTRAN spectra from a model trained on previous runs
+
+import itertools
+import json
+import numpy as np
+from modtran.main import execute
+from modtran.parameters import Parameters, input_value, to_parameters
+
+
+INPUTS = ['H2OSTR', 'VIS', 'PARM2', 'ANGLE', 'GNDALT', 'CO2MX']
+"""
+Continuous inputs the surrogate is trained over by default
+"""
+
+COLUMNS = ['TOTAL RAD', 'TRANS']
+"""
+tape7.scn columns predicted by default
+"""
+
+
+class Surrogate:
+    """Approximates MODTRAN spectra over a few continuous inputs, trained on previous runs.
+
+    Each predicted column is compressed with principal component analysis (PCA) and the
+    principal component scores are fit with a polynomial in the inputs.  All other inputs
+    are fixed at the values used by the training cases.
+
+
+    Keyword Arguments:
+
+    inputs : list of str
+        Names of the continuous inputs (see 'help(modtran.run)')
+        Default setting is ['H2OSTR', 'VIS', 'PARM2', 'ANGLE', 'GNDALT', 'CO2MX']
+
+    columns : list of str
+        tape7.scn columns to predict (see 'help(modtran.run)')
+        Default setting is ['TOTAL RAD', 'TRANS']
+
+    components : int
+        Maximum number of principal components kept per column
+        Default setting is 10
+
+    degree : int
+        Degree of the polynomial fit to the principal component scores.  Needs at least
+        as many training cases as polynomial terms (28 for 6 inputs with degree 2).
+        Default setting is 2
+
+    regularization : float
+        Ridge penalty on the polynomial coefficients
+        Default setting is 1e-8
+    """
+
+    def __init__(self,
+                 inputs: list = INPUTS,
+                 columns: list = COLUMNS,
+                 components: int = 10,
+                 degree: int = 2,
+                 regularization: float = 1e-8,
+        ):
+        self.inputs = list(inputs)
+        self.columns = list(columns)
+        self.components = components
+        self.degree = degree
+        self.regularization = regularization
+        self.base = None         # inputs shared by every training case
+        self.units = None        # units prefix of each input
+        self.lower = None        # smallest training value of each input
+        self.upper = None        # largest training value of each input
+        self.wavelengths = None
+        self.models = {}         # column -> (mean, basis, coefficients)
+        self.errors = {}         # column -> RMS error spectrum on held-out cases
+
+    def fit(self, cases: list, outputs: list, holdout: float = 0.2, seed: int = 0):
+        """Trains the surrogate on MODTRAN runs, e.g. the cases and outputs of modtran.run_batch.
+
+        cases : list
+            List of modtran.Parameters, or dictionaries of modtran.run keyword arguments.
+            The cases may only differ in the surrogate's inputs.
+
+        outputs : list
+            Output dictionaries of the cases, as returned by modtran.run
+
+        holdout : float
+            Fraction of the cases held out to estimate the prediction error (stored in the
+            'errors' attribute) before the final fit to all cases
+            Default setting is 0.2
+
+        seed : int
+            Seed for choosing the held-out cases
+            Default setting is 0
+
+        Returns the surrogate itself
+        """
+        params = [to_parameters(case) for case in cases]
+        if len(params) != len(outputs) or len(params) == 0:
+            raise ValueError("Need one output for each of at least one case")
+        self.base = self._base(params[0])
+        self.units = [input_value(params[0], name)[0] for name in self.inputs]
+        for case in params:
+            if self._base(case) != self.base:
+                raise ValueError("Training cases may only differ in the surrogate inputs " + str(self.inputs))
+            if [input_value(case, name)[0] for name in self.inputs] != self.units:
+                raise ValueError("Training cases must use the same units for H2OSTR and O3STR")
+        X = np.array([[input_value(case, name)[1] for name in self.inputs] for case in params])
+        self.wavelengths = np.asarray(outputs[0]['WAVELEN MCRN'])
+        Y = {}
+        for column in self.columns:
+            Y[column] = np.array([output[column] for output in outputs], dtype=float)
+            if Y[column].shape[1] != len(self.wavelengths):
+                raise ValueError("Training outputs must share the same wavelengths")
+        self.lower = X.min(axis=0)
+        self.upper = X.max(axis=0)
+
+        # Estimate the error on held-out cases, then fit to every case
+        num_holdout = int(round(holdout * len(X)))
+        if num_holdout > 0:
+            test = np.random.default_rng(seed).permutation(len(X))[:num_holdout]
+            train = np.setdiff1d(np.arange(len(X)), test)
+            self._fit(X[train], {column: Y[column][train] for column in self.columns})
+            predicted = self.predict(X[test])
+            for column in self.columns:
+                self.errors[column] = np.sqrt(np.mean((predicted[column] - Y[column][test]) ** 2, axis=0))
+        self._fit(X, Y)
+        return self
+
+    def _base(self, params):
+        return {name: value for name, value in params.as_dict().items() if name not in self.inputs}
+
+    def _features(self, X):
+        # Polynomial terms in the inputs scaled to [-1, 1] over the training domain
+        span = np.where(self.upper > self.lower, self.upper - self.lower, 1.0)
+        Z = 2 * (X - self.lower) / span - 1
+        terms = [np.ones(len(Z))]
+        for degree in range(1, self.degree + 1):
+            for combination in itertools.combinations_with_replacement(range(Z.shape[1]), degree):
+                terms.append(np.prod(Z[:, combination], axis=1))
+        return np.stack(terms, axis=1)
+
+    def _fit(self, X, Y):
+        F = self._features(X)
+        if F.shape[0] < F.shape[1]:
+            print("WARNING: " + str(F.shape[0]) + " training cases for " + str(F.shape[1]) +
+                  " polynomial terms, consider lowering the degree")
+        penalty = self.regularization * np.eye(F.shape[1])
+        for column in self.columns:
+            mean = Y[column].mean(axis=0)
+            U, S, Vt = np.linalg.svd(Y[column] - mean, full_matrices=False)
+            basis = Vt[:min(self.components, int(np.sum(S > S[0] * 1e-10)) if len(S) else 0)]
+            scores = (Y[column] - mean) @ basis.T
+            coefficients = np.linalg.solve(F.T @ F + penalty, F.T @ scores)
+            self.models[column] = (mean, basis, coefficients)
+
+    def _as_array(self, queries):
+        if isinstance(queries, dict):
+            columns = np.broadcast_arrays(*[np.asarray(queries[name], dtype=float) for name in self.inputs])
+            return np.stack([column.ravel() for column in columns], axis=1)
+        if isinstance(queries, (list, tuple)) and len(queries) > 0 and isinstance(queries[0], (dict, Parameters)):
+            return np.array([[input_value(to_parameters(case), name)[1] for name in self.inputs]
+                             for case in queries])
+        return np.atleast_2d(np.asarray(queries, dtype=float))
+
+    def predict(self, queries) -> dict:
+        """Predicts spectra for a batch of inputs.
+
+        queries : array, dict or list
+            Either an (N, len(inputs)) array, a dictionary of arrays keyed by input name
+            (broadcast against each other), or a list of modtran.Parameters/dictionaries.
+            H2OSTR and O3STR are given as numbers in the units of the training cases.
+
+        Returns a dictionary with 'WAVELEN MCRN' and an (N, wavelengths) array per column
+        """
+        if not self.models:
+            raise RuntimeError("Surrogate has not been trained, call fit() first")
+        X = self._as_array(queries)
+        F = self._features(X)
+        output = {'WAVELEN MCRN': self.wavelengths}
+        for column in self.columns:
+            mean, basis, coefficients = self.models[column]
+            output[column] = mean + (F @ coefficients) @ basis
+        return output
+
+    def in_domain(self, queries) -> np.ndarray:
+        """Returns a boolean array, True where the inputs lie inside the training domain"""
+        X = self._as_array(queries)
+        return np.all((X >= self.lower) & (X <= self.upper), axis=1)
+
+    def covers(self, params: Parameters) -> bool:
+        """Returns True if the surrogate can predict params (same fixed inputs, inside the domain)"""
+        if self._base(params) != self.base:
+            return False
+        units, values = zip(*[input_value(params, name) for name in self.inputs])
+        return list(units) == self.units and bool(self.in_domain(np.array([values]))[0])
+
+    def run(self,
+            username: str = None,
+            password: str = None,
+            hostname: str = 'grissom.cis.rit.edu',
+            quiet: bool = False,
+            progress = None,
+            store = None,
+            session = None,
+            **kwargs
+        ) -> dict:
+        """Drop-in replacement for modtran.run that predicts the output when possible.
+
+        Takes the same arguments as modtran.run.  If the case lies outside the training
+        domain, MODTRAN is run instead (with quiet, progress and store as in modtran.run)
+        through session (a modtran.Session) if given, or by logging in as username (with
+        password, or an SSH key or agent if password is None), otherwise a ValueError is
+        raised.
+
+        Returns an output dictionary with 'tape5', 'WAVELEN MCRN', the predicted columns,
+        'error' (dictionary of RMS error spectra on held-out cases, per column) and
+        'surrogate' (True if the output was predicted, False if MODTRAN was run)
+        """
+        params = Parameters(**kwargs)
+        if not self.covers(params):
+            if session is not None:
+                output = store.get(params) if store is not None else None
+                if output is None:
+                    output = session.run(params, quiet=quiet, progress=progress)
+                    if store is not None:
+                        store.put(params, output, session.hostname)
+            elif username is not None:
+                output = execute(username, password, params, hostname, quiet=quiet, progress=progress, store=store)
+            else:
+                raise ValueError("Case lies outside the surrogate's training domain, " +
+                                 "pass a session or username to run MODTRAN instead")
+            output['surrogate'] = False
+            return output
+
+        X = np.array([[input_value(params, name)[1] for name in self.inputs]])
+        predicted = self.predict(X)
+        output = {}
+        output['tape5'] = params.tape5
+        output['WAVELEN MCRN'] = self.wavelengths
+        for column in self.columns:
+            output[column] = predicted[column][0]
+        output['error'] = dict(self.errors)
+        output['surrogate'] = True
+        return output
+
+    def save(self, path: str):
+        """Saves the trained surrogate to a .npz file"""
+        arrays = {'lower': self.lower, 'upper': self.upper, 'wavelengths': self.wavelengths}
+        for i, column in enumerate(self.columns):
+            mean, basis, coefficients = self.models[column]
+            arrays['mean' + str(i)] = mean
+            arrays['basis' + str(i)] = basis
+            arrays['coefficients' + str(i)] = coefficients
+            if column in self.errors:
+                arrays['error' + str(i)] = self.errors[column]
+        settings = {'inputs': self.inputs, 'columns': self.columns, 'components': self.components,
+                    'degree': self.degree, 'regularization': self.regularization,
+                    'base': self.base, 'units': self.units}
+        np.savez(path, settings=json.dumps(settings), **arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a surrogate saved with save()"""
+        with np.load(path) as data:
+            settings = json.loads(str(data['settings']))
+            surrogate = cls(settings['inputs'], settings['columns'], settings['components'],
+                            settings['degree'], settings['regularization'])
+            surrogate.base = settings['base']
+            surrogate.units = settings['units']
+            surrogate.lower = data['lower']
+            surrogate.upper = data['upper']
+            surrogate.wavelengths = data['wavelengths']
+            for i, column in enumerate(surrogate.columns):
+                surrogate.models[column] = (data['mean' + str(i)], data['basis' + str(i)],
+                                            data['coefficients' + str(i)])
+                if 'error' + str(i) in data:
+                    surrogate.errors[column] = data['error' + str(i)]
+        return surrogate
@@ -0,0 +1,66 @@
+# Reads the data columns from the tape7.scn output file
+
+import numpy as np
+
+
+COLUMNS = ['WAVELEN MCRN', 'TRANS', 'PTH THRML', 'THRML SCT', 'SURF EMIS', 'SOL SCAT', 'SING SCAT',
+           'GRND RFLT', 'DRCT RFLT', 'TOTAL RAD', 'REF SOL', 'SOL@OBS', 'DEPTH']
+"""
+Names of the data columns in tape7.scn, in file order
+"""
+
+
+def read_tape7(text: str) -> dict:
+    """Parses the text of a tape7.scn file.
+
+    Returns a dictionary with one numpy array per column (see COLUMNS).  Columns that
+    cannot be read are filled with NaN.
+    """
+    tape7scn = text.splitlines(keepends=True)
+    output = {}
+
+    num_lines = len(tape7scn)
+    num_header_lines = 11
+    num_footer_lines = 1
+    num_data_lines = num_lines - num_header_lines - num_footer_lines
+    num_columns = 13
+
+    tape7scn_array = np.zeros((num_data_lines, num_columns), dtype='<U16')
+    for i in range(num_data_lines):
+        row = num_header_lines + i
+        tape7scn_array[i, 0] = tape7scn[row][  4: 12]  # WAVELEN_MCRN
+        tape7scn_array[i, 1] = tape7scn[row][ 13: 19]  # TRANS
+        tape7scn_array[i, 2] = tape7scn[row][ 20: 30]  # PTH_THRML
+        tape7scn_array[i, 3] = tape7scn[row][ 31: 41]  # THRML_SCT
+        tape7scn_array[i, 4] = tape7scn[row][ 42: 52]  # SURF_EMIS
+        tape7scn_array[i, 5] = tape7scn[row][ 53: 63]  # SOL_SCAT
+        tape7scn_array[i, 6] = tape7scn[row][ 64: 74]  # SING_SCAT
+        tape7scn_array[i, 7] = tape7scn[row][ 75: 85]  # GRND_RFLT
+        tape7scn_array[i, 8] = tape7scn[row][ 86: 96]  # DRCT_RFLT
+        tape7scn_array[i, 9] = tape7scn[row][ 97:107]  # TOTAL_RAD
+        tape7scn_array[i,10] = tape7scn[row][108:116]  # REF_SOL
+        tape7scn_array[i,11] = tape7scn[row][117:125]  # SOLaOBS
+        tape7scn_array[i,12] = tape7scn[row][129:134]  # DEPTH
+
+    data_values = np.zeros_like(tape7scn_array, dtype=float)
+    for j in range(num_columns):
+        try:
+            data_values[:, j] = tape7scn_array[:, j].astype(float)
+        except:
+            data_values[:, j] = np.nan
+
+    output['WAVELEN MCRN'] = data_values[:, 0]
+    output['TRANS']        = data_values[:, 1]
+    output['PTH THRML']    = data_values[:, 2]
+    output['THRML SCT']    = data_values[:, 3]
+    output['SURF EMIS']    = data_values[:, 4]
+    output['SOL SCAT']     = data_values[:, 5]
+    output['SING SCAT']    = data_values[:, 6]
+    output['GRND RFLT']    = data_values[:, 7]
+    output['DRCT RFLT']    = data_values[:, 8]
+    output['TOTAL RAD']    = data_values[:, 9]
+    output['REF SOL']      = data_values[:,10]
+    output['SOL@OBS']      = data_values[:,11]
+    output['DEPTH']        = data_values[:,12]
+
+    return output
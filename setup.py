@@ -41,6 +41,20 @@ setup(
         include=["modtran", "modtran.*"]
     ),
 
+    # Optional dependencies, e.g. 'pip install modtran[parquet]' to write Parquet shards
+    extras_require={
+        "parquet": ["pyarrow"],
+        "test": ["pytest"],
+    },
+
+    # Here we define the 'modtran' command-line batch runner and the connection broker
+    entry_points={
+        "console_scripts": [
+            "modtran=modtran.cli:main",
+            "modtran-broker=modtran.broker:main",
+        ],
+    },
+
     # # Here we specify any package data, if required
     # package_data={}
     # include_package_data=True,
@@ -0,0 +1,147 @@
+import functools
+import os
+import socket
+import tempfile
+import threading
+import time
+import pytest
+from modtran import broker, main
+from modtran.broker import Broker, request, submit
+from modtran.parameters import Parameters
+from modtran.session import Progress
+
+
+def fake_output(case):
+    return {'tape5': case.tape5, 'stdout': 'MODTRAN DONE', 'stderr': '', 'tape7.scn': '\n' * 12, 'runtime': 1.0}
+
+
+class FakeTransport:
+    def is_active(self):
+        return True
+
+
+class FakeSSH:
+    def get_transport(self):
+        return FakeTransport()
+
+
+class FakeSession:
+    '''Stand-in for modtran.Session that reports progress, fails cases with SURREF = 0.5
+    and sleeps for SURREF = 0.9'''
+    instances = []
+
+    def __init__(self, username, password, hostname, workspaces=1, prefix='modtran-temp', key_filename=None):
+        self.hostname = hostname
+        self.ssh = FakeSSH()
+        FakeSession.instances.append(self)
+
+    def run(self, case, quiet=False, progress=None):
+        if case.SURREF == 0.5:
+            raise ValueError("Invalid case")
+        if case.SURREF == 0.9:
+            time.sleep(0.5)
+        if progress is not None:
+            progress(Progress(0.5, 15000.0, 'FREQ = 15000.00 CM-1'))
+        return fake_output(case)
+
+    def close(self):
+        pass
+
+
+class FakeContext:
+    '''Stand-in for the modtran.Session that execute opens when the broker fails'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def run(self, case, quiet=False, progress=None):
+        return dict(fake_output(case), stdout='DIRECT RUN')
+
+
+@pytest.fixture
+def directory():
+    # Unix socket paths are limited to about 100 characters, too short for pytest's tmp_path
+    with tempfile.TemporaryDirectory(prefix='broker-', dir='/tmp') as directory:
+        yield directory
+
+
+@pytest.fixture
+def server(monkeypatch, directory):
+    monkeypatch.setattr(broker, 'Session', FakeSession)
+    monkeypatch.setattr(FakeSession, 'instances', [])
+    server = Broker(os.path.join(directory, 'broker.sock'), workspaces=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fake_broker(path, reply):
+    # Accepts one connection, reads the message and sends reply (or nothing if None)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def serve():
+        connection, address = listener.accept()
+        with connection:
+            connection.makefile('rb').readline()
+            if reply is None:
+                time.sleep(1.0)
+            else:
+                connection.sendall(reply)
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+
+
+def test_cases_share_one_session(server):
+    events = []
+    output = submit('user', 'secret', Parameters(SURREF=0.1), quiet=True, progress=events.append,
+                    path=server.server_address)
+    assert output['stdout'] == 'MODTRAN DONE'
+    assert events == [Progress(0.5, 15000.0, 'FREQ = 15000.00 CM-1')]
+    submit('user', 'secret', Parameters(SURREF=0.2), quiet=True, path=server.server_address)
+    assert len(FakeSession.instances) == 1
+    assert request({'command': 'ping'}, server.server_address)['sessions'] == [['grissom.cis.rit.edu', 'user']]
+
+
+def test_errors_keep_their_type(server):
+    with pytest.raises(ValueError, match='Invalid case'):
+        submit('user', 'secret', Parameters(SURREF=0.5), quiet=True, path=server.server_address)
+
+
+def test_heartbeat_keeps_long_runs_alive(server, monkeypatch):
+    monkeypatch.setattr(broker, 'HEARTBEAT', 0.05)
+    message = {'username': 'user', 'password': 'secret', 'hostname': 'grissom.cis.rit.edu',
+               'case': Parameters(SURREF=0.9).as_dict()}
+    assert 'output' in request(message, server.server_address, read_timeout=0.3)
+
+
+def test_unresponsive_broker_times_out(directory):
+    path = os.path.join(directory, 'broker.sock')
+    fake_broker(path, None)
+    with pytest.raises(socket.timeout):
+        request({'command': 'ping'}, path, read_timeout=0.2)
+
+
+def test_malformed_reply_is_a_connection_error(directory):
+    path = os.path.join(directory, 'broker.sock')
+    fake_broker(path, b'<html>\n')
+    with pytest.raises(ConnectionError, match='malformed'):
+        request({'command': 'ping'}, path)
+
+
+def test_execute_falls_back_to_a_direct_run(directory, monkeypatch):
+    path = os.path.join(directory, 'broker.sock')
+    fake_broker(path, b'{"done": true, "output": {"tape5": "truncated"}}\n')
+    monkeypatch.setattr(broker, 'available', lambda: True)
+    monkeypatch.setattr(broker, 'submit', functools.partial(broker.submit, path=path))
+    monkeypatch.setattr(main, 'Session', lambda *args, **kwargs: FakeContext())
+    output = main.execute('user', 'secret', Parameters(SURREF=0.1), quiet=True)
+    assert output['stdout'] == 'DIRECT RUN'
+
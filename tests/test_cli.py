@@ -0,0 +1,121 @@
+import json
+import numpy as np
+import paramiko
+import pytest
+from modtran import batch
+from modtran.cli import ShardWriter, csv_case, main, read_cases
+from modtran.cost import CostModel
+from modtran.tape7 import COLUMNS
+
+
+def fake_output(length, tape5='tape5'):
+    output = {column: np.linspace(0.1, 1.0, length) for column in COLUMNS}
+    output['tape5'] = tape5
+    output['runtime'] = 1.0
+    return output
+
+
+class FakeSession:
+    '''Stand-in for modtran.Session that fails cases with SURREF = 0.5'''
+    login_error = None
+
+    def __init__(self, username, password, hostname, workspaces, prefix, key_filename):
+        if FakeSession.login_error is not None:
+            raise FakeSession.login_error
+        self.hostname = hostname
+
+    def run(self, case, quiet=False, progress=None):
+        if case.SURREF == 0.5:
+            raise RuntimeError("MODTRAN did not write tape7.scn")
+        return fake_output(3, case.tape5)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    monkeypatch.setattr(batch, 'Session', FakeSession)
+    monkeypatch.setattr(batch, 'CostModel', lambda: CostModel(None))
+    monkeypatch.setattr(FakeSession, 'login_error', None)
+
+
+def test_read_cases_jsonl_and_csv(tmp_path):
+    (tmp_path / 'cases.jsonl').write_text('{"SURREF": 0.1}\n\n{"SURREF": 0.2, "IHAZE": 1}\n')
+    assert read_cases(str(tmp_path / 'cases.jsonl')) == [{'SURREF': 0.1}, {'SURREF': 0.2, 'IHAZE': 1}]
+    (tmp_path / 'cases.csv').write_text('SURREF,IHAZE\n0.1,\n0.2,1\n')
+    assert read_cases(str(tmp_path / 'cases.csv')) == [{'SURREF': '0.1'}, {'SURREF': '0.2', 'IHAZE': '1'}]
+
+
+def test_read_cases_rejects_unknown_csv_columns(tmp_path):
+    (tmp_path / 'cases.csv').write_text('SURREF,ALBEDO\n0.1,0.2\n')
+    with pytest.raises(ValueError, match='ALBEDO'):
+        read_cases(str(tmp_path / 'cases.csv'))
+
+
+def test_csv_case_converts_types():
+    case = csv_case({'SURREF': ' 0.1', 'IHAZE': '1', 'H2OSTR': 'g1.5'})
+    assert case == {'SURREF': 0.1, 'IHAZE': 1, 'H2OSTR': 'g1.5'}
+    assert type(case['IHAZE']) is int
+    with pytest.raises(ValueError):
+        csv_case({'IHAZE': 'rural'})
+
+
+def test_jsonl_on_stdout_writes_null_for_nan(capsys):
+    writer = ShardWriter(None, 'jsonl')
+    output = fake_output(3)
+    output['TRANS'] = np.array([0.5, np.nan, np.inf])
+    writer.write(7, output)
+    record = json.loads(capsys.readouterr().out)
+    assert record['index'] == 7
+    assert record['TRANS'] == [0.5, None, None]
+
+
+def test_npz_shards_are_padded(tmp_path):
+    writer = ShardWriter(str(tmp_path), 'npz', size=2)
+    for index, length in enumerate([2, 3, 4]):
+        writer.write(index, fake_output(length))
+    writer.close()
+    assert writer.shards == 2
+    with np.load(str(tmp_path / 'shard-00000.npz')) as shard:
+        assert list(shard['index']) == [0, 1]
+        assert list(shard['length']) == [2, 3]
+        assert shard['TRANS'].shape == (2, 3)
+        assert np.isnan(shard['TRANS'][0, 2])
+
+
+def test_jsonl_shards_are_valid_json(tmp_path):
+    writer = ShardWriter(str(tmp_path), 'jsonl', size=10)
+    output = fake_output(2)
+    output['TOTAL RAD'] = np.array([np.nan, 1.0])
+    writer.write(0, output)
+    writer.close()
+    record = json.loads((tmp_path / 'shard-00000.jsonl').read_text(), parse_constant=pytest.fail)
+    assert record['TOTAL RAD'] == [None, 1.0]
+
+
+def test_main_streams_results(fake_session, tmp_path, capsys):
+    (tmp_path / 'cases.jsonl').write_text('{"SURREF": 0.1}\n{"SURREF": 0.2}\n{"SURREF": 0.1}\n')
+    assert main([str(tmp_path / 'cases.jsonl'), '-u', 'user']) == 0
+    captured = capsys.readouterr()
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert sorted(record['index'] for record in records) == [0, 1, 2]
+    assert 'COMPLETED 3 OF 3 CASES (2 UNIQUE)' in captured.err
+
+
+def test_main_reports_failed_cases(fake_session, tmp_path, capsys):
+    (tmp_path / 'cases.csv').write_text('SURREF\n0.1\n0.5\n7\n')
+    assert main([str(tmp_path / 'cases.csv'), '-u', 'user', '-o', str(tmp_path / 'out')]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert 'INVALID CASE (INPUT 2)' in captured.err
+    assert 'FAILED CASE (INPUT 1)' in captured.err
+    with np.load(str(tmp_path / 'out' / 'shard-00000.npz')) as shard:
+        assert list(shard['index']) == [0]
+
+
+def test_main_reports_login_failure(fake_session, tmp_path, capsys):
+    FakeSession.login_error = paramiko.AuthenticationException("Authentication failed.")
+    (tmp_path / 'cases.jsonl').write_text('{"SURREF": 0.1}\n')
+    assert main([str(tmp_path / 'cases.jsonl'), '-u', 'user']) == 2
+    assert 'could not run on the server: Authentication failed.' in capsys.readouterr().err
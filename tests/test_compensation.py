@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from modtran.compensation import albedo_coefficients, compensate, planck, resample
+from modtran.parameters import Parameters
+
+
+def synthetic_output(SURREF=0.5, scale=1.0):
+    '''MODTRAN-like output dictionary with smooth made-up spectra'''
+    wavelengths = np.linspace(0.4, 2.5, 421)
+    output = {'tape5': Parameters(SURREF=SURREF).tape5, 'WAVELEN MCRN': wavelengths}
+    output['TRANS'] = 0.5 + 0.3 * np.sin(wavelengths)
+    output['PTH THRML'] = 1e-6 * wavelengths
+    output['SOL SCAT'] = scale * 1e-4 / wavelengths ** 4
+    output['GRND RFLT'] = scale * SURREF * 1e-3 * np.exp(-wavelengths)
+    for column in ['THRML SCT', 'SURF EMIS', 'DRCT RFLT']:
+        output[column] = np.zeros_like(wavelengths)
+    output['TOTAL RAD'] = output['PTH THRML'] + output['SOL SCAT'] + output['GRND RFLT']
+    return output
+
+
+def forward(output, bands, reflectance):
+    terms = resample(output, bands)
+    path = terms['SOL SCAT'] + terms['PTH THRML']
+    gain = terms['GRND RFLT'] / 0.5
+    return path + gain * reflectance
+
+
+def test_resample_interpolates_and_averages():
+    output = synthetic_output()
+    bands = np.array([0.5, 1.0, 2.0])
+    assert resample(output, bands, columns=['TRANS'])['TRANS'] == pytest.approx(0.5 + 0.3 * np.sin(bands))
+    narrow = resample(output, bands, fwhm=0.001, columns=['TRANS'])['TRANS']
+    assert narrow == pytest.approx(0.5 + 0.3 * np.sin(bands), rel=1e-4)
+
+
+def test_planck_peak():
+    wavelengths = np.linspace(5, 15, 1001)
+    assert wavelengths[np.argmax(planck(wavelengths, 300.0))] == pytest.approx(2897.8 / 300.0, abs=0.02)
+
+
+@pytest.mark.parametrize('interleave', ['bip', 'bil', 'bsq'])
+def test_reflectance_is_recovered(interleave):
+    output = synthetic_output()
+    bands = np.linspace(0.45, 2.4, 8)
+    truth = np.random.default_rng(0).uniform(0.05, 0.9, (10, 7, len(bands)))
+    cube = forward(output, bands, truth)
+    axes = {'bip': (0, 1, 2), 'bil': (0, 2, 1), 'bsq': (2, 0, 1)}[interleave]
+    result = compensate(np.transpose(cube, axes), bands, output, interleave=interleave, block_rows=3, workers=2)
+    assert np.transpose(result, np.argsort(axes)) == pytest.approx(truth, rel=1e-5)
+
+
+def test_parameter_map_selects_outputs():
+    outputs = {0: synthetic_output(scale=1.0), 1: synthetic_output(scale=2.0)}
+    bands = np.linspace(0.45, 2.4, 5)
+    truth = np.full((4, 3, len(bands)), 0.3)
+    parameter_map = np.array([[0, 1, 0]] * 4)
+    cube = np.where(parameter_map[:, :, None] == 0, forward(outputs[0], bands, truth), forward(outputs[1], bands, truth))
+    result = compensate(cube, bands, outputs, parameter_map=parameter_map)
+    assert result == pytest.approx(truth, rel=1e-5)
+    with pytest.raises(KeyError):
+        compensate(cube, bands, outputs, parameter_map=parameter_map + 5)
+
+
+def test_band_count_must_match():
+    with pytest.raises(ValueError):
+        compensate(np.zeros((2, 2, 3)), [0.5, 0.6], synthetic_output())
+
+
+def multiple_scattering_output(SURREF, albedo=0.2):
+    '''Output whose ground-reflected radiance follows r / (1 - S r), as MODTRAN's does'''
+    output = synthetic_output(SURREF)
+    direct = 1e-3 * np.exp(-output['WAVELEN MCRN'])
+    output['GRND RFLT'] = direct * SURREF / (1 - albedo * SURREF)
+    return output
+
+
+def test_spherical_albedo_is_fitted():
+    outputs = [multiple_scattering_output(0.1), multiple_scattering_output(0.8)]
+    bands = np.linspace(0.45, 2.4, 6)
+    offset, gain, albedo = albedo_coefficients(outputs, bands)
+    assert albedo == pytest.approx(np.full(6, 0.2), rel=1e-3)
+    with pytest.raises(ValueError):
+        albedo_coefficients([outputs[0], outputs[0]], bands)
+
+
+def test_reflectance_with_multiple_scattering():
+    bands = np.linspace(0.45, 2.4, 6)
+    outputs = [multiple_scattering_output(0.1), multiple_scattering_output(0.5), multiple_scattering_output(0.9)]
+    truth = np.random.default_rng(1).uniform(0.02, 0.95, (5, 4, len(bands)))
+    terms = resample(outputs[0], bands)
+    direct = resample({'WAVELEN MCRN': outputs[0]['WAVELEN MCRN'], 'D': 1e-3 * np.exp(-outputs[0]['WAVELEN MCRN'])},
+                      bands, columns=['D'])['D']
+    cube = terms['SOL SCAT'] + terms['PTH THRML'] + direct * truth / (1 - 0.2 * truth)
+    assert compensate(cube, bands, outputs) == pytest.approx(truth, rel=1e-4)
+    single = compensate(cube, bands, outputs[1])  # single-albedo approximation, biased away from SURREF = 0.5
+    assert np.max(np.abs(single - truth)) > 0.02
+    with pytest.raises(ValueError):
+        compensate(cube, bands, outputs, mode='emissivity', temperature=300.0)
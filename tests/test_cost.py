@@ -0,0 +1,66 @@
+import json
+import pytest
+from modtran.cost import CostModel, estimate, schedule
+from modtran.parameters import Parameters
+
+
+class FixedCosts:
+    '''Cost model with given runtimes, keyed by SURREF'''
+
+    def __init__(self, runtimes):
+        self.runtimes = runtimes
+
+    def predict(self, case):
+        return self.runtimes[case.SURREF]
+
+
+def test_schedule_longest_first():
+    cases = [Parameters(SURREF=s) for s in [0.1, 0.2, 0.3, 0.4]]
+    costs = FixedCosts({0.1: 1.0, 0.2: 4.0, 0.3: 2.0, 0.4: 3.0})
+    order, makespan = schedule(cases, 1, costs)
+    assert order == [1, 3, 2, 0]
+    assert makespan == pytest.approx(10.0)
+
+
+def test_schedule_parallel_makespan():
+    cases = [Parameters(SURREF=s) for s in [0.1, 0.2, 0.3, 0.4, 0.5]]
+    costs = FixedCosts({0.1: 3.0, 0.2: 3.0, 0.3: 2.0, 0.4: 2.0, 0.5: 2.0})
+    order, makespan = schedule(cases, 2, costs)
+    assert makespan == pytest.approx(7.0)  # LPT: {3, 2, 2} and {3, 2}
+    assert schedule(cases, 10, costs)[1] == pytest.approx(3.0)
+
+
+def test_schedule_needs_a_worker():
+    with pytest.raises(ValueError):
+        schedule([Parameters()], 0, FixedCosts({0.75: 1.0}))
+
+
+def test_estimate_removes_duplicates():
+    costs = FixedCosts({0.1: 5.0})
+    assert estimate([{'SURREF': 0.1}, Parameters(SURREF=0.1)], 1, costs) == pytest.approx(5.0)
+
+
+def test_prior_ranks_correlated_k_slower():
+    model = CostModel(path=None)
+    assert model.predict({'MODTRN': 'K'}) > model.predict({'MODTRN': 'M'})
+    assert model.predict({'V2': 2.5}) > model.predict({'V2': 0.5})
+
+
+def test_recorded_runtimes_are_fitted(tmp_path):
+    path = str(tmp_path / 'runtimes.jsonl')
+    model = CostModel(path)
+    for i in range(20):
+        model.record({'SURREF': 0.1}, 100.0)
+    assert CostModel(path).predict({'SURREF': 0.1}) == pytest.approx(model.predict({'SURREF': 0.1}))
+    assert model.predict({'SURREF': 0.1}) > CostModel(path=None).predict({'SURREF': 0.1})
+
+
+def test_malformed_log_lines_are_skipped(tmp_path):
+    path = tmp_path / 'runtimes.jsonl'
+    CostModel(str(path)).record({}, 10.0)
+    with open(path, 'a') as file:
+        file.write('{"inputs": {"MODTRN": "M", "SPE\n')
+        file.write('[1, 2]\n')
+        file.write(json.dumps({'inputs': {'MODTRN': 'M'}, 'runtime': 3.0}) + '\n')
+        file.write(json.dumps({'params': Parameters(MODTRN='K').as_dict(), 'runtime': 40.0}) + '\n')
+    assert len(CostModel(str(path))) == 2
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import modtran
+from modtran import derivatives
+from modtran.derivatives import perturb, step_size
+from modtran.formats import F
+from modtran.parameters import Parameters, with_input
+
+
+def fake_run_batch(username, password, cases, hostname, workers):
+    # Output linear in ANGLE and PARM2, so every difference recovers the same slope
+    return [{'WAVELEN MCRN': np.array([0.5, 1.0]),
+             'TOTAL RAD': np.array([1.0, 2.0]) * (2 * case.ANGLE + 3 * case.PARM2)} for case in cases]
+
+
+def test_small_values_are_written_in_fixed_point():
+    assert F(1e-05, 10, 5) == '   0.00001'
+    assert with_input(Parameters(), 'GNDALT', 1e-05).GNDALT == 1e-05
+    assert '0.00001' in with_input(Parameters(), 'GNDALT', 1e-05).tape5
+
+
+def test_step_size_at_zero():
+    params = Parameters()
+    assert step_size(params, 'GNDALT') == pytest.approx(0.01)
+    assert step_size(params, 'PARM2', step=0.0001) == pytest.approx(0.001)
+    assert step_size(Parameters(H1=50.0), 'H1') == pytest.approx(0.5)
+
+
+def test_perturb_stays_inside_limits():
+    assert perturb(Parameters(ANGLE=180.0), 'ANGLE', 181.8) is None
+    assert perturb(Parameters(GNDALT=0.0), 'GNDALT', -0.01) is None
+    assert perturb(Parameters(SURREF=1.0), 'SURREF', 1.01) is None
+    assert perturb(Parameters(ANGLE=180.0), 'ANGLE', 178.2).ANGLE == 178.2
+
+
+def test_central_difference_falls_back_to_one_sided_at_a_limit(monkeypatch):
+    monkeypatch.setattr(derivatives, 'run_batch', fake_run_batch)
+    result = modtran.jacobian('user', None, Parameters(ANGLE=180.0, PARM2=30.0), ['ANGLE', 'PARM2'])
+    assert result['jacobian'].shape == (2, 2, 1)
+    assert result['jacobian'][:, :, 0] == pytest.approx(np.array([[2.0, 4.0], [3.0, 6.0]]))
+    assert result['steps'] == pytest.approx([1.8, 0.6])
+
+
+def test_ignored_input_is_reported(monkeypatch):
+    monkeypatch.setattr(derivatives, 'run_batch', fake_run_batch)
+    with pytest.raises(ValueError, match='G is ignored'):
+        modtran.jacobian('user', None, Parameters(IPH=2), ['G'])
+
+
+def test_package_exports_the_function_and_the_module():
+    assert callable(modtran.jacobian)
+    assert modtran.derivatives.jacobian is modtran.jacobian
@@ -0,0 +1,57 @@
+import pytest
+from modtran.parameters import Parameters, input_value
+
+
+def test_equivalent_inputs_compare_equal():
+    assert Parameters(MODTRN='', SPEED=' ') == Parameters(MODTRN='M', SPEED='S')
+    assert Parameters(H2OSTR='g1.50') == Parameters(H2OSTR='g1.5')
+    assert Parameters(SURREF=0.123456) == Parameters(SURREF=0.1234)
+    assert Parameters(TPTEMP=300) == Parameters(TPTEMP=300.0)
+    assert Parameters(IHAZE=1, VIS=23.0) == Parameters(IHAZE=1, VIS=0.0)
+
+
+def test_ignored_inputs_are_reset():
+    assert Parameters(IPH=2, G=0.7) == Parameters(IPH=2)
+    assert Parameters(ISOURC=0, ANGLEM=90.0) == Parameters(ISOURC=0)
+    assert Parameters(IHAZE=1, WSS=5.0) == Parameters(IHAZE=1)
+    assert Parameters(IHAZE=1, ICSTL=1) == Parameters(IHAZE=1, ICSTL=10)
+
+
+def test_used_inputs_are_kept():
+    assert Parameters(IPH=0, G=0.7) != Parameters(IPH=0)
+    assert Parameters(IHAZE=3, WSS=5.0) != Parameters(IHAZE=3)
+    assert Parameters(IHAZE=3, ICSTL=1) != Parameters(IHAZE=3, ICSTL=10)
+    assert Parameters(CNOVAM='N', ICSTL=1) != Parameters(CNOVAM='N', ICSTL=10)
+    assert Parameters(IHAZE=1, VIS=30.0) != Parameters(IHAZE=1)
+
+
+@pytest.mark.parametrize('inputs', [
+    {'G': 'x'},
+    {'G': 5.0},
+    {'ANGLEM': 999.0},
+    {'ICSTL': 99},
+    {'WSS': 'fast'},
+    {'DIS': 'F', 'NSTR': 3},
+    {'DIS': 'F', 'DISAZM': 'X'},
+])
+def test_ignored_inputs_are_still_validated(inputs):
+    with pytest.raises((TypeError, ValueError)):
+        Parameters(**inputs)
+
+
+def test_equal_parameters_deduplicate():
+    cases = [Parameters(SURREF=0.1), Parameters(SURREF=0.10001), Parameters(SURREF=0.2)]
+    assert len(set(cases)) == 2
+    assert Parameters(SURREF=0.1).tape5 == Parameters(SURREF=0.10001).tape5
+
+
+def test_invalid_inputs_raise():
+    with pytest.raises((TypeError, ValueError)):
+        Parameters(MODEL='2')
+    with pytest.raises((TypeError, ValueError)):
+        Parameters(MODTRN='MM')
+
+
+def test_input_value_reports_default_visibility():
+    assert input_value(Parameters(IHAZE=1), 'VIS') == ('', 23.0)
+    assert input_value(Parameters(H2OSTR='g1.5'), 'H2OSTR') == ('g', 1.5)
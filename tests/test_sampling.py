@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from modtran import sampling
+from modtran.parameters import Parameters
+from modtran.sampling import adaptive_sample, center, corners, edges, split
+
+
+def fake_run_batch(function):
+    def run_batch(username, password, cases, hostname, workers):
+        return [{'TOTAL RAD': np.array([function(case), 2 * function(case)])} for case in cases]
+    return run_batch
+
+
+def test_cell_geometry():
+    cell = ((0.0, 0.0), (2.0, 4.0))
+    assert sorted(corners(cell)) == [(0.0, 0.0), (0.0, 4.0), (2.0, 0.0), (2.0, 4.0)]
+    assert center(cell) == (1.0, 2.0)
+    assert edges(cell) == [((0.0, 0.0), (1.0, 0.0), (2.0, 0.0)), ((0.0, 0.0), (0.0, 2.0), (0.0, 4.0))]
+
+
+def test_split_along_chosen_inputs():
+    cell = ((0.0, 0.0), (2.0, 4.0))
+    assert len(split(cell)) == 4
+    assert sorted(split(cell, [1])) == [((0.0, 0.0), (2.0, 2.0)), ((0.0, 2.0), (2.0, 4.0))]
+
+
+def test_linear_output_needs_no_refinement(monkeypatch):
+    monkeypatch.setattr(sampling, 'run_batch', fake_run_batch(lambda case: 1 + case.PARM2 + case.ANGLE))
+    result = adaptive_sample('user', None, Parameters(), {'PARM2': (0, 40), 'ANGLE': (140, 180)}, initial=2)
+    assert result['converged']
+    assert len(result['cells']) == 1
+    assert len(result['cases']) == 4 + 1 + 2
+    assert result['points'].shape == (7, 2)
+
+
+def test_refines_only_along_the_input_driving_the_error(monkeypatch):
+    monkeypatch.setattr(sampling, 'run_batch', fake_run_batch(lambda case: 1 + (case.PARM2 / 10) ** 2 + case.ANGLE))
+    result = adaptive_sample('user', None, Parameters(), {'PARM2': (0, 40), 'ANGLE': (140, 180)},
+                             tolerance=0.001, initial=2)
+    assert result['converged']
+    assert len(result['cells']) > 1
+    assert all(lower[1] == 140 and upper[1] == 180 for lower, upper, error in result['cells'])
+    assert all(error <= 0.001 for lower, upper, error in result['cells'])
+
+
+def test_cells_at_tape5_precision_are_unresolved(monkeypatch):
+    monkeypatch.setattr(sampling, 'run_batch', fake_run_batch(lambda case: 1.0 + (case.PARM2 > 10.0005)))
+    result = adaptive_sample('user', None, Parameters(), {'PARM2': (0, 20)}, initial=2)
+    assert not result['converged']
+    assert len(result['unresolved']) == 1
+    lower, upper, error = result['unresolved'][0]
+    assert lower[0] <= 10.0005 <= upper[0]
+    assert upper[0] - lower[0] <= 0.005
+    assert error > 0.01
+
+
+def test_starting_grid_must_fit_the_budget(monkeypatch):
+    monkeypatch.setattr(sampling, 'run_batch', fake_run_batch(lambda case: 1.0))
+    with pytest.raises(ValueError, match='budget'):
+        adaptive_sample('user', None, Parameters(), {'PARM2': (0, 40), 'ANGLE': (140, 180)}, budget=5)
@@ -0,0 +1,131 @@
+import paramiko
+import pytest
+from modtran import session
+from modtran.parameters import Parameters
+from modtran.session import LineBuffer, Session, parse_progress
+
+
+class FakeChannel:
+    def recv_exit_status(self):
+        return 0
+
+
+class FakeStream:
+    channel = FakeChannel()
+
+    def read(self):
+        return b''
+
+
+class FakeSFTP:
+    def normalize(self, path):
+        return '/home/user'
+
+    def close(self):
+        pass
+
+
+class FakeSSHClient:
+    '''Stand-in for paramiko.SSHClient that records commands; open_sftp fails after sftp_limit calls'''
+    sftp_limit = 100
+
+    def __init__(self):
+        self.commands = []
+        self.closed = False
+        self.sftp_calls = 0
+        FakeSSHClient.last = self
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def open_sftp(self):
+        self.sftp_calls += 1
+        if self.sftp_calls > self.sftp_limit:
+            raise paramiko.SSHException("Channel closed")
+        return FakeSFTP()
+
+    def exec_command(self, command):
+        self.commands.append(command)
+        return None, FakeStream(), FakeStream()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def ssh(monkeypatch):
+    monkeypatch.setattr(paramiko, 'SSHClient', FakeSSHClient)
+    FakeSSHClient.sftp_limit = 100
+    return FakeSSHClient
+
+
+def test_workspace_paths_are_quoted(ssh):
+    session = Session('user', 'password', prefix='my runs; echo', workspaces=2)
+    assert "rm -rf '/home/user/my runs; echo-0'" in ssh.last.commands[0]
+    session.close()
+    assert ssh.last.commands[-1] == "rm -rf '/home/user/my runs; echo-0' '/home/user/my runs; echo-1'"
+    assert ssh.last.closed
+
+
+@pytest.mark.parametrize('prefix', ['', '.', '..', '../other', 'a/b'])
+def test_prefix_must_be_a_directory_name(ssh, prefix):
+    with pytest.raises(ValueError):
+        Session('user', 'password', prefix=prefix)
+
+
+def test_failed_setup_removes_workspaces_and_closes(ssh):
+    ssh.sftp_limit = 2  # home directory lookup and the first workspace channel succeed
+    with pytest.raises(paramiko.SSHException):
+        Session('user', 'password', workspaces=3, prefix='ws')
+    assert ssh.last.commands[-1] == 'rm -rf /home/user/ws-0 /home/user/ws-1 /home/user/ws-2'
+    assert ssh.last.closed
+
+
+# Screen output of a thermal-IR run (8-14 micron, 714-1250 cm-1) in the style of MODTRAN's
+# card echo, with numbers inside the spectral range on lines that are not frequency reports
+THERMAL_SCREEN = """\
+ ***** MODTRAN4 VERSION 3 REVISION 1 *****
+ CARD 1  *****MS  2    2    2   -1    0    0    0    0    0    0    1    0    0 294.000 0.7500
+ CARD 1A *****TT  8T  10 365.00000         0         0 F F F T           0
+ CARD 4  *****  8.000    14.000     0.050     0.100RM        MRAA     0
+ NUMBER OF LAYERS =  1000
+ 1024 ATMOSPHERIC LEVELS READ
+ FREQ =     714.29 CM-1
+ FREQ =     900.00 CM-1
+ FREQ =    1250.00 CM-1
+ MODTRAN DONE"""
+
+
+def test_parse_progress_only_reads_frequency_reports():
+    params = Parameters(V1=8.0, V2=14.0, DV=0.05)
+    events = [parse_progress(line, params) for line in THERMAL_SCREEN.split('\n')]
+    reported = [event for event in events if event is not None]
+    assert [event.wavenumber for event in reported] == [714.29, 900.0, 1250.0]
+    assert reported[0].fraction == pytest.approx(0.0, abs=1e-3)
+    assert reported[-1].fraction == pytest.approx(1.0, abs=1e-3)
+    assert all(events[i] is None for i in range(6))
+
+
+def test_parse_progress_ignores_frequencies_outside_the_range():
+    assert parse_progress(' FREQ =   28571.43 CM-1', Parameters(V1=8.0, V2=14.0)) is None
+    assert parse_progress(' FREQ =   20000.00 CM-1', Parameters()).fraction == pytest.approx(0.5385, abs=1e-3)
+
+
+def test_line_buffer_splits_and_bounds_lines(monkeypatch):
+    monkeypatch.setattr(session, 'BUFFER_LINES', 3)
+    lines = []
+    buffer = LineBuffer(lines.append)
+    buffer.feed(b'one\r\ntw')
+    buffer.feed(b'o\nthree\nfour\nfi')
+    assert lines == ['one', 'two', 'three', 'four']
+    assert buffer.text() == 'three\nfour\nfi'
+    assert lines[-1] == 'fi'
+
+
+def test_line_buffer_replaces_undecodable_bytes():
+    buffer = LineBuffer()
+    buffer.feed(b'bad \xff byte\n')
+    assert buffer.text() == 'bad � byte'
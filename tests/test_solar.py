@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from modtran import solar
+from modtran.parameters import Parameters
+from modtran.solar import run_solar, solar_cases, solar_position
+
+
+def test_equinox_noon_at_equator():
+    zenith, azimuth, day = solar_position(0.0, 0.0, '2021-03-20T12:07:00')
+    assert zenith < 1.0
+    assert day == 79
+
+
+def test_morning_sun_is_in_the_east():
+    zenith, azimuth, day = solar_position(43.16, -77.61, '2021-06-21T12:00:00')  # 8 am in Rochester
+    assert 60 < azimuth < 90
+    assert 50 < zenith < 70
+
+
+def test_winter_night_at_the_north_pole():
+    zenith, azimuth, day = solar_position(89.9, 0.0, '2021-12-21T12:00:00')
+    assert zenith == pytest.approx(90 + 23.44, abs=0.5)
+
+
+def test_inputs_broadcast():
+    times = np.array(['2021-06-21T10:00', '2021-06-21T14:00'], dtype='datetime64[s]')
+    zenith, azimuth, day = solar_position([[10.0], [20.0], [30.0]], 0.0, times)
+    assert zenith.shape == azimuth.shape == day.shape == (3, 2)
+
+
+def test_solar_cases_share_snapped_suns():
+    times = np.arange('2021-06-21T11:00', '2021-06-21T13:00', np.timedelta64(1, 'm'), dtype='datetime64[s]')
+    exact, exact_index = solar_cases(Parameters(), 43.16, -77.61, times)
+    snapped, snapped_index = solar_cases(Parameters(), 43.16, -77.61, times, angle_tolerance=5.0)
+    assert len(snapped) < len(exact)
+    assert snapped_index.shape == times.shape
+    for i in snapped_index:
+        assert snapped[i].PARM2 % 5.0 == pytest.approx(0.0, abs=1e-6)
+
+
+def test_solar_cases_skip_night():
+    cases, index = solar_cases({}, 43.16, -77.61, ['2021-06-21T04:00', '2021-06-21T16:00'])
+    assert index[0] == -1
+    assert index[1] == 0 and len(cases) == 1
+
+
+def test_run_solar_shares_outputs_between_observations(monkeypatch):
+    batches = []
+
+    def run_batch(username, password, cases, **kwargs):
+        batches.append((cases, kwargs))
+        return [{'PARM2': case.PARM2} for case in cases]
+
+    monkeypatch.setattr(solar, 'run_batch', run_batch)
+    times = ['2021-06-21T04:00', '2021-06-21T16:00', '2021-06-21T16:00:10']
+    outputs = run_solar('user', None, {}, 43.16, -77.61, times, angle_tolerance=5.0, workers=2)
+    assert len(batches) == 1 and batches[0][1] == {'workers': 2}
+    assert outputs[0] is None
+    assert outputs[1] is outputs[2]
+    assert outputs[1]['PARM2'] % 5.0 == pytest.approx(0.0, abs=1e-6)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from modtran.parameters import Parameters
+from modtran.store import ResultStore, find_pairs, import_archive
+
+
+def tape7_text(wavelengths, radiance):
+    '''tape7.scn text with the column layout read by modtran.tape7.read_tape7'''
+    header = ['header'] * 11
+    rows = ['    %8.4f %6.4f' % (w, 0.9) + ' %10.3e' * 8 % ((0.0,) * 7 + (r,)) + ' %8.2e %8.2e    %5.3f' % (1.0, 1.0, 0.1)
+            for w, r in zip(wavelengths, radiance)]
+    return '\n'.join(header + rows + ['-9999.']) + '\n'
+
+
+@pytest.fixture
+def store():
+    store = ResultStore(':memory:')
+    yield store
+    store.close()
+
+
+def test_put_and_get(store):
+    params = Parameters(SURREF=0.2)
+    text = tape7_text([0.4, 0.5, 0.6], [1e-3, 2e-3, 3e-3])
+    store.put(params, {'tape7.scn': text}, 'test')
+    assert len(store) == 1
+    assert {'SURREF': 0.2} in store
+    assert Parameters(SURREF=0.3) not in store
+    output = store.get({'SURREF': 0.20001})  # same tape5
+    assert output['tape5'] == params.tape5
+    assert output['WAVELEN MCRN'] == pytest.approx([0.4, 0.5, 0.6])
+    assert output['TOTAL RAD'] == pytest.approx([1e-3, 2e-3, 3e-3])
+    assert store.get(Parameters(SURREF=0.3)) is None
+
+
+def test_add_reads_inputs_from_tape5(store):
+    params = Parameters(IHAZE=3, ICSTL=5)
+    store.add({'tape5': params.tape5, 'tape7.scn': tape7_text([0.4], [1e-3])})
+    assert params in store
+    assert Parameters(IHAZE=3, ICSTL=6) not in store
+
+
+def test_import_archive(store, tmp_path):
+    good = Parameters(SURREF=0.4)
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'tape5').write_text(good.tape5)
+    (tmp_path / 'a' / 'tape7.scn').write_text(tape7_text([0.4, 0.5], [1e-3, 2e-3]))
+    (tmp_path / 'run1.tp5').write_text('not a tape5\n')
+    (tmp_path / 'run1.7sc').write_text(tape7_text([0.4], [1e-3]))
+    (tmp_path / 'lonely.tape5').write_text(good.tape5)
+    assert len(find_pairs(str(tmp_path))) == 2
+    result = import_archive(str(tmp_path), store, workers=2)
+    assert result['imported'] == 1
+    assert len(result['skipped']) == 1
+    assert np.all(store.get(good)['TOTAL RAD'] == np.array([1e-3, 2e-3]))
@@ -0,0 +1,97 @@
+import itertools
+import numpy as np
+import pytest
+from modtran import surrogate as surrogate_module
+from modtran.parameters import Parameters
+from modtran.surrogate import Surrogate
+
+
+WAVELENGTHS = np.linspace(0.4, 1.0, 61)
+
+
+def synthetic_output(params):
+    '''Smooth made-up spectra that depend on PARM2 and VIS'''
+    sun = np.cos(np.radians(params.PARM2))
+    haze = 23.0 / (params.VIS or 23.0)
+    return {'WAVELEN MCRN': WAVELENGTHS,
+            'TOTAL RAD': sun * np.exp(-WAVELENGTHS) * (1 + 0.1 * haze),
+            'TRANS': np.exp(-0.2 * haze / WAVELENGTHS)}
+
+
+def training_set():
+    cases = [Parameters(PARM2=zenith, VIS=vis) for zenith, vis in itertools.product([0.0, 20.0, 40.0, 60.0],
+                                                                                     [10.0, 20.0, 40.0, 80.0])]
+    return cases, [synthetic_output(case) for case in cases]
+
+
+@pytest.fixture
+def trained():
+    cases, outputs = training_set()
+    return Surrogate(inputs=['PARM2', 'VIS'], degree=3).fit(cases, outputs)
+
+
+def test_predictions_match_inside_the_domain(trained):
+    query = Parameters(PARM2=30.0, VIS=30.0)
+    predicted = trained.predict([query])
+    expected = synthetic_output(query)
+    for column in ['TOTAL RAD', 'TRANS']:
+        assert predicted[column][0] == pytest.approx(expected[column], rel=0.03)
+    assert set(trained.errors) == {'TOTAL RAD', 'TRANS'}
+
+
+def test_domain(trained):
+    assert trained.covers(Parameters(PARM2=30.0, VIS=30.0))
+    assert not trained.covers(Parameters(PARM2=70.0, VIS=30.0))
+    assert not trained.covers(Parameters(PARM2=30.0, VIS=30.0, SURREF=0.1))
+    assert list(trained.in_domain({'PARM2': [10.0, 90.0], 'VIS': 20.0})) == [True, False]
+
+
+def test_training_cases_must_share_other_inputs():
+    cases, outputs = training_set()
+    cases[3] = cases[3].replace(SURREF=0.2)
+    with pytest.raises(ValueError):
+        Surrogate(inputs=['PARM2', 'VIS']).fit(cases, outputs)
+
+
+def test_save_and_load(trained, tmp_path):
+    path = str(tmp_path / 'surrogate.npz')
+    trained.save(path)
+    loaded = Surrogate.load(path)
+    queries = {'PARM2': [5.0, 25.0], 'VIS': [15.0, 50.0]}
+    for column in ['TOTAL RAD', 'TRANS']:
+        assert loaded.predict(queries)[column] == pytest.approx(trained.predict(queries)[column])
+        assert loaded.errors[column] == pytest.approx(trained.errors[column])
+
+
+def test_run_predicts_inside_the_domain(trained):
+    output = trained.run(quiet=True, progress=print, store=None, PARM2=30.0, VIS=30.0)
+    assert output['surrogate']
+    assert output['tape5'] == Parameters(PARM2=30.0, VIS=30.0).tape5
+
+
+def test_run_falls_back_to_modtran(trained, monkeypatch):
+    calls = []
+
+    def execute(username, password, params, hostname, quiet, progress, store):
+        calls.append((username, password, quiet, progress, store))
+        return synthetic_output(params)
+
+    monkeypatch.setattr(surrogate_module, 'execute', execute)
+    output = trained.run('user', None, quiet=True, progress=print, PARM2=70.0)  # SSH key or agent login
+    assert not output['surrogate']
+    assert calls == [('user', None, True, print, None)]
+    with pytest.raises(ValueError):
+        trained.run(PARM2=70.0)
+
+
+def test_run_falls_back_to_a_session(trained):
+    class FakeSession:
+        hostname = 'host'
+
+        def run(self, params, quiet, progress):
+            self.arguments = (params, quiet, progress)
+            return synthetic_output(params)
+
+    session = FakeSession()
+    assert not trained.run(session=session, progress=print, PARM2=70.0)['surrogate']
+    assert session.arguments == (Parameters(PARM2=70.0), False, print)
@@ -0,0 +1,39 @@
+import pytest
+from modtran.parameters import Parameters
+from modtran.tape5 import read_tape5
+
+
+CASES = [
+    {},
+    {'SURREF': 0.1, 'H2OSTR': 'g1.5', 'O3STR': 'a0.3'},
+    {'MODTRN': 'K', 'SPEED': 'M', 'DIS': 'F', 'MODEL': 6},
+    {'IHAZE': 3, 'WSS': 4.5, 'WHH': 3.0, 'ICSTL': 7, 'VIS': 15.0},
+    {'ISOURC': 1, 'ANGLEM': 45.0, 'IPH': 0, 'G': 0.7, 'IDAY': 200, 'PARM1': 120.5, 'PARM2': 33.25},
+    {'GNDALT': 1.25, 'H1': 5.0, 'H2': 1.25, 'ANGLE': 160.0, 'V1': 0.4, 'V2': 2.5, 'DV': 0.01},
+]
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_round_trip(case):
+    params = Parameters(**case)
+    assert Parameters(**read_tape5(params.tape5)) == params
+    assert Parameters.from_tape5(params.tape5).tape5 == params.tape5
+
+
+def test_round_trip_with_windows_line_endings():
+    params = Parameters(SURREF=0.3)
+    assert Parameters.from_tape5(params.tape5.replace('\n', '\r\n')) == params
+
+
+def test_wrong_number_of_cards():
+    lines = Parameters().tape5.split('\n')
+    with pytest.raises(ValueError):
+        read_tape5('\n'.join(lines[:-2]))
+
+
+def test_fixed_input_changed():
+    lines = Parameters().tape5.split('\n')
+    assert lines[4].startswith('   12')  # IPARM, fixed by this API
+    lines[4] = '   11' + lines[4][5:]
+    with pytest.raises(ValueError):
+        read_tape5('\n'.join(lines))